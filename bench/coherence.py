@@ -0,0 +1,158 @@
+"""
+Check that cached pages stay correct across several worker processes,
+as under gunicorn: a write handled by one worker must be seen by all
+the others, and a cold worker should reuse pages from the shared cache.
+
+Run from the repository root with
+    python -m bench.coherence [--workers 3]
+
+Exits with a non-zero status if any check fails.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+
+def load_app(tmp: str):
+    """Import the app with its database and caches in `tmp`"""
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    from werkzeug.security import generate_password_hash
+    os.environ['ADMIN_PASSWORD_HASH'] = generate_password_hash('bench')
+
+    import config
+    config.DATABASE_FILE = str(Path(tmp, 'bench.db'))
+    config.DATA_VERSION_FILE = str(Path(tmp, 'data_version'))
+    config.SHARED_RESPONSE_CACHE_FILE = str(Path(tmp, 'cache.db'))
+
+    import rounders
+    return rounders
+
+
+def seed(tmp: str) -> None:
+    rounders = load_app(tmp)
+    from rounders.models import Match, Team
+    db = rounders.db
+
+    with rounders.app.app_context():
+        rounders.migrations.upgrade()
+        teams = [Team(name=f'Team {i}', year=2025) for i in range(4)]  # type: ignore
+        db.session.add_all(teams)
+        db.session.flush()
+        db.session.add_all([
+            Match(team1_id=a.id, team2_id=b.id, score1=3, score2=2)  # type: ignore
+            for i, a in enumerate(teams) for b in teams[i + 1:]
+        ])
+        db.session.commit()
+
+
+def worker(tmp: str, conn) -> None:
+    """Serve commands from the parent until told to stop"""
+    rounders = load_app(tmp)
+    from rounders import cache
+
+    shared_hits = 0
+    shared_get = cache.SharedResponseCache.get
+    def counting_get(self, key, version):
+        nonlocal shared_hits
+        entry = shared_get(self, key, version)
+        shared_hits += entry is not None
+        return entry
+    cache.SharedResponseCache.get = counting_get
+
+    client = rounders.app.test_client()
+    admin = rounders.app.test_client()
+    admin.post('/login', data=dict(username='admin', password='bench'))
+
+    while True:
+        cmd, *args = conn.recv()
+        if cmd == 'get':
+            url, headers = args
+            r = client.get(url, headers=headers)
+            conn.send((r.status_code, r.headers.get('ETag'), r.get_data(as_text=True)))
+        elif cmd == 'edit':
+            match_id, score = args
+            r = admin.post(f'/matches/{match_id}/edit', data=dict(
+                date='2025-07-01', time='18:00',
+                score1_in1=score, score1_in2=0, score2_in1=0, score2_in2=0,
+            ))
+            conn.send(r.status_code)
+        elif cmd == 'shared_hits':
+            conn.send(shared_hits)
+        elif cmd == 'stop':
+            conn.send(None)
+            return
+
+
+class Worker:
+    def __init__(self, ctx, tmp: str) -> None:
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=worker, args=(tmp, child))
+        self.process.start()
+
+    def call(self, *cmd):
+        self.conn.send(cmd)
+        return self.conn.recv()
+
+    def get(self, url, **headers):
+        return self.call('get', url, headers)
+
+    def stop(self):
+        self.call('stop')
+        self.process.join()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--workers', type=int, default=3)
+    args = argparser.parse_args()
+
+    ctx = mp.get_context('spawn')
+    failures = []
+
+    def check(ok: bool, description: str):
+        print(('PASS' if ok else 'FAIL'), description)
+        if not ok:
+            failures.append(description)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        p = ctx.Process(target=seed, args=(tmp,))
+        p.start(); p.join()
+
+        workers = [Worker(ctx, tmp) for _ in range(args.workers)]
+        url = '/matches/?year=2025'
+
+        # Every worker caches the page
+        before = [w.get(url) for w in workers]
+        before = [w.get(url) for w in workers]
+        check(len({b[2] for b in before}) == 1, 'all workers serve the same page')
+        check(sum(w.call('shared_hits') for w in workers[1:]) > 0, 'workers reuse pages rendered by another')
+
+        cold = Worker(ctx, tmp)
+        check(cold.get(url)[2] == before[0][2], 'a new worker serves the same page')
+        check(cold.call('shared_hits') == 1, 'a new worker takes the page from the shared cache')
+        workers.append(cold)
+
+        # One worker writes, all must see it
+        check(workers[0].call('edit', 1, 17) == 302, 'score edited')
+        after = [w.get(url) for w in workers]
+        check(all('17.0' in a[2] for a in after), 'every worker serves the new score')
+        check(all('17.0' not in b[2] for b in before), 'the new score was not there before')
+        check(len({a[1] for a in after}) == 1 and after[0][1] != before[0][1], 'the ETag changed on every worker')
+
+        etag = after[0][1]
+        revalidated = [w.get(url, **{'If-None-Match': etag}) for w in workers]
+        check(all(r[0] == 304 for r in revalidated), 'every worker answers 304 for the current ETag')
+
+        for w in workers:
+            w.stop()
+
+    print(f'{len(failures)} checks failed')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Parallel readers and a writer sharing one database file, as with several
+gunicorn workers, comparing the legacy storage settings (rollback journal,
+no busy timeout, no retries) with the profile in `config.py`.
+
+Run from the repository root with
+    python -m bench.concurrency [--readers 4] [--seconds 10]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+PROFILES = {
+    'legacy': dict(
+        SQLITE_PRAGMAS={'journal_mode': 'DELETE', 'busy_timeout': 0, 'synchronous': 'FULL'},
+        SQLITE_CHECKPOINT_INTERVAL=None,
+        WRITE_RETRIES=1,
+    ),
+    'tuned': {},
+}
+
+
+def load_app(db_file: str, profile: str):
+    """Import the app using the given database and storage profile"""
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    from werkzeug.security import generate_password_hash
+    os.environ['ADMIN_PASSWORD_HASH'] = generate_password_hash('bench')
+
+    import config
+    config.DATABASE_FILE = db_file
+    for k, v in PROFILES[profile].items():
+        setattr(config, k, v)
+
+    import rounders
+    rounders.app.logger.disabled = True
+    return rounders
+
+
+def seed(db_file: str, profile: str) -> None:
+    rounders = load_app(db_file, profile)
+    from rounders.models import Match, Team
+    db = rounders.db
+
+    with rounders.app.app_context():
+        rounders.migrations.upgrade()
+        rng = random.Random(0)
+        for year in (2024, 2025):
+            teams = [Team(name=f'Team {year}-{i}', year=year) for i in range(12)]  # type: ignore
+            db.session.add_all(teams)
+            db.session.flush()
+            db.session.add_all([
+                Match(team1_id=a.id, team2_id=b.id, score1=rng.randint(0, 10), score2=rng.randint(0, 10))  # type: ignore
+                for i, a in enumerate(teams) for b in teams[i + 1:]
+            ])
+        db.session.commit()
+
+
+def reader(db_file: str, profile: str, seconds: float, results) -> None:
+    rounders = load_app(db_file, profile)
+    client = rounders.app.test_client()
+    ok = errors = 0
+    latencies = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        t = time.perf_counter()
+        r = client.get(random.choice(['/teams/', '/matches/', '/']), headers={'hx-request': 'true'})
+        latencies.append(time.perf_counter() - t)
+        if r.status_code == 200: ok += 1
+        else: errors += 1
+    results.put(('read', ok, errors, latencies))
+
+
+def writer(db_file: str, profile: str, seconds: float, results) -> None:
+    rounders = load_app(db_file, profile)
+    client = rounders.app.test_client()
+    client.post('/login', data=dict(username='admin', password='bench'))
+    ok = errors = 0
+    latencies = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        t = time.perf_counter()
+        r = client.post(f'/matches/{random.randint(1, 132)}/edit', data=dict(
+            date='2025-07-01', time='18:00',
+            score1_in1=random.randint(0, 5), score1_in2=random.randint(0, 5),
+            score2_in1=random.randint(0, 5), score2_in2=random.randint(0, 5),
+        ))
+        latencies.append(time.perf_counter() - t)
+        if r.status_code == 302: ok += 1
+        else: errors += 1
+        time.sleep(0.01)
+    results.put(('write', ok, errors, latencies))
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))] * 1000 if xs else float('nan')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--readers', type=int, default=4)
+    argparser.add_argument('--seconds', type=float, default=10)
+    args = argparser.parse_args()
+
+    ctx = mp.get_context('spawn')
+    print(f'{"profile":>8} {"kind":>6} {"ok/s":>8} {"errors":>7} {"p50 ms":>8} {"p99 ms":>8}')
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = str(Path(tmp, 'bench.db'))
+            p = ctx.Process(target=seed, args=(db_file, profile))
+            p.start(); p.join()
+
+            results = ctx.Queue()
+            procs = [ctx.Process(target=reader, args=(db_file, profile, args.seconds, results)) for _ in range(args.readers)]
+            procs.append(ctx.Process(target=writer, args=(db_file, profile, args.seconds, results)))
+            for p in procs: p.start()
+            collected = [results.get() for _ in procs]
+            for p in procs: p.join()
+
+        for kind in ('read', 'write'):
+            rs = [r for r in collected if r[0] == kind]
+            ok = sum(r[1] for r in rs)
+            errors = sum(r[2] for r in rs)
+            latencies = [x for r in rs for x in r[3]]
+            print(f'{profile:>8} {kind:>6} {ok / args.seconds:>8.1f} {errors:>7} '
+                  f'{percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
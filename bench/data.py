@@ -0,0 +1,135 @@
+"""
+A seeded generator of realistic synthetic data, in a throwaway copy of the app.
+
+`load_app()` imports the app with its database, caches, assets and
+attachments in a temporary folder, and `generate()` fills it with seasons
+of teams playing a round-robin, and posts of generated photos. The same
+seed always generates the same data.
+"""
+
+import datetime
+import os
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+STATIC = ('styles', 'scripts', 'images', 'favicons')
+"""Folders of the static assets, linked into the temporary static folder"""
+
+
+@dataclass(frozen=True)
+class Size:
+    years:   int = 3
+    """Seasons, ending with the year after `config.LAST_COMPLETE_YEAR`, which is still being played"""
+    teams:   int = 12
+    """Teams in each season, each playing every other once"""
+    players: int = 8
+    """Players in each team"""
+    posts:   int = 10
+    """Posts on the photos page"""
+    photos:  int = 3
+    """Photos in each post"""
+
+
+def load_app(tmp: str):
+    """Import the app with everything it writes in `tmp`, never touching the real database or attachments"""
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    if 'ADMIN_PASSWORD_HASH' not in os.environ:
+        from werkzeug.security import generate_password_hash
+        os.environ['ADMIN_PASSWORD_HASH'] = generate_password_hash('bench')
+
+    import config
+    config.DATABASE_FILE = str(Path(tmp, 'bench.db'))
+    config.DATA_VERSION_FILE = str(Path(tmp, 'data_version'))
+    config.ASSETS_FOLDER = str(Path(tmp, 'assets'))
+    config.METRICS_FOLDER = None
+    config.SHARED_RESPONSE_CACHE_FILE = None
+
+    import rounders
+    app = rounders.app
+
+    # The real assets, with the attachments in the temporary folder,
+    # linked by the first process to load the app from it
+    static = Path(tmp, 'static')
+    if not static.exists():
+        static.mkdir()
+        for folder in STATIC:
+            Path(static, folder).symlink_to(Path(app.static_folder, folder)) # type: ignore
+    app.static_folder = str(static)
+    app.config['ATTACHMENTS_FOLDER'] = Path(static, 'attachments')
+
+    with app.app_context():
+        rounders.migrations.upgrade()
+    return rounders
+
+
+def _photo(rng: random.Random, path: Path) -> None:
+    """A landscape photo of a smooth gradient with noise, which compresses about as well as a real one"""
+    from PIL import Image, ImageFilter
+    colours = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+    im = Image.linear_gradient('L').resize((1600, 1200)).convert('RGB')
+    im = Image.composite(Image.new('RGB', im.size, colours[0]), Image.new('RGB', im.size, colours[1]), im.convert('L'))
+    noise = Image.frombytes('L', im.size, rng.randbytes(im.width * im.height)).convert('RGB').filter(ImageFilter.GaussianBlur(1))
+    Image.blend(im, noise, 0.15).save(path, quality=90)
+
+
+def generate(rounders, size: Size = Size(), seed: int = 0) -> None:
+    """Fill the database of the app loaded by `load_app()`"""
+    import config
+    from rounders import db, filestore, thumbnails
+    from rounders.blogs import THUMB_READY, Attachment, Entry
+    from rounders.models import Match, Player, Team
+
+    rng = random.Random(seed)
+    last_year = config.LAST_COMPLETE_YEAR + 1
+    with rounders.app.app_context():
+        for year in range(last_year - size.years + 1, last_year + 1):
+            teams = [Team(name=f'Team {year}-{i + 1}', year=year) for i in range(size.teams)]  # type: ignore
+            db.session.add_all(teams)
+            db.session.flush()
+            db.session.add_all([
+                Player(team_id=t.id, name_first=f'First {rng.randrange(100)}', name_last=f'Last {rng.randrange(100)}')  # type: ignore
+                for t in teams for _ in range(size.players)
+            ])
+
+            # Three matches on each Monday and Thursday evening from June,
+            # the season still being played is half done
+            day = datetime.datetime(year, 6, 1, 17)
+            day += datetime.timedelta(days=-day.weekday() % 7)
+            pairs = [(a, b) for i, a in enumerate(teams) for b in teams[i + 1:]]
+            rng.shuffle(pairs)
+            for i, (a, b) in enumerate(pairs):
+                date = day + datetime.timedelta(weeks=i // 6, days=3 * (i // 3 % 2), hours=i % 2)
+                played = rng.random() < (0.95 if year < last_year else 0.5)
+                innings = played and rng.random() < 0.6
+                score1_in1, score2_in1 = (rng.randrange(8) / 2, rng.randrange(8) / 2) if innings else (None, None)
+                score1 = (score1_in1 or 0) + rng.randrange(12) / 2 if played else None
+                # Some matches were abandoned with only one score
+                score2 = (score2_in1 or 0) + rng.randrange(12) / 2 if played and rng.random() < 0.97 else None
+                db.session.add(Match(
+                    team1_id=a.id, team2_id=b.id,
+                    score1=score1, score2=score2, score1_in1=score1_in1, score2_in1=score2_in1,
+                    play_date=None if rng.random() < 0.05 else int(date.timestamp()),
+                ))  # type: ignore
+
+        # Posts of photos, with their variants made here rather than in the background
+        folder = rounders.app.config['ATTACHMENTS_FOLDER']
+        folder.mkdir(parents=True, exist_ok=True)
+        first = int(datetime.datetime(last_year, 6, 1).timestamp())
+        for i in range(size.posts):
+            entry = Entry(title=f'Post {i + 1}', text='Photos from the evening' if i % 2 else None, date=first + 86400 * i)  # type: ignore
+            db.session.add(entry)
+            db.session.flush()
+            for _ in range(size.photos):
+                src = Path(folder, '.photo.jpg')
+                _photo(rng, src)
+                with open(src, 'rb') as f:
+                    stored = filestore.store(f, folder, 'jpg')
+                src.unlink()
+                a = Attachment(blog_id=entry.id, name=stored.name)  # type: ignore
+                a.record_file(stored.size)
+                variants = [(s, str(p)) for s, p in a._variantpaths]
+                a.width, a.height = thumbnails.make_variants(str(a._filepath), variants)
+                a.thumb_state = THUMB_READY
+                db.session.add(a)
+        db.session.commit()
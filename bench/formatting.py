@@ -0,0 +1,96 @@
+"""
+Time grouping and sorting a table of matches by the `formatting` fields,
+as `/matches/` does, for a large number of synthetic matches, with a
+`FormatAs` object in every cell of a DataFrame, and with the columnar
+functions and a `Table`.
+
+Run from the repository root with
+    python -m bench.formatting [--matches 50000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from rounders import formatting as fmt
+from rounders.table import Table
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--matches', type=int, default=50_000)
+    argparser.add_argument('--repeat', type=int, default=3)
+    args = argparser.parse_args()
+
+    # Matches at 18:00 or 19:00 on Mondays and Thursdays over ten summers,
+    # with some dates still to be confirmed
+    rng = np.random.default_rng(0)
+    start = 1_685_984_400  # Mon 5 Jun 2023, 17:00 UTC
+    days = rng.choice([0, 3], args.matches) + 7 * rng.integers(0, 8, args.matches) + 365 * rng.integers(0, 10, args.matches)
+    timestamps = start + 86400 * days + 3600 * rng.integers(1, 3, args.matches)
+    tbc = rng.random(args.matches) < 0.05
+    dates = [None if t else int(ts) for ts, t in zip(timestamps, tbc)]
+    played = (rng.random(args.matches) < 0.7).tolist()
+    scores = (rng.integers(0, 20, args.matches) / 2).tolist()
+
+    def build():
+        return pd.DataFrame(dict(
+            week   = [fmt.AsWeekOf(d, newest_first=p) for d, p in zip(dates, played)],
+            date   = [fmt.AsDate(d, newest_first=p) for d, p in zip(dates, played)],
+            time   = [fmt.AsTime(d, newest_first=p) for d, p in zip(dates, played)],
+            score  = [fmt.AsScore(s) for s in scores],
+            played = played,
+        ))
+
+    def build_columns():
+        return Table(dict(
+            week      = fmt.week_names(dates),
+            week_key  = fmt.sort_keys(fmt.week_starts(dates)),
+            date      = fmt.date_names(dates),
+            time      = fmt.time_names(dates),
+            date_key  = fmt.sort_keys(dates),
+            score     = fmt.score_names(scores),
+            score_key = fmt.sort_keys(scores),
+            played    = played,
+        ))
+
+    def sort_and_group_columns(table):
+        groups = 0
+        for p in (False, True):
+            rows = table.where(lambda m: m['played'] == p).sort_values('date_key', ascending=not p)
+            for _, group in fmt.grouped(rows, 'week_key', 'week_key', 'week', descending=p):
+                groups += 1
+                [str(m['date']) for m in group]
+        return groups
+
+    def sort_and_group(df):
+        df = df.sort_values('date')
+        groups = 0
+        for p in (False, True):
+            for _, group in df[df['played'] == p].groupby('week'):
+                groups += 1
+                [str(x) for x in group['date']]
+        return groups
+
+    variants = dict(
+        objects = (build, sort_and_group),
+        columns = (build_columns, sort_and_group_columns),
+    )
+    print(f'{args.matches} matches, best of {args.repeat}')
+    print(f'{"":>8} {"build ms":>9} {"group ms":>9}')
+    for name, (build_df, group_df) in variants.items():
+        timings = dict(build=[], group=[])
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            df = build_df()
+            timings['build'].append(time.perf_counter() - t)
+            t = time.perf_counter()
+            group_df(df)
+            timings['group'].append(time.perf_counter() - t)
+        print(f'{name:>8} {min(timings["build"]) * 1000:9.1f} {min(timings["group"]) * 1000:9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Time generating the variants of a large synthetic photo, decoding it once
+at a reduced scale, against decoding it in full for each variant,
+and compare the size of each variant with the original upload.
+
+Run from the repository root with
+    python -m bench.images [--width 6000] [--height 4000]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+import config
+from rounders.thumbnails import make_variants
+
+
+def full_decode(src: str, variants: list[tuple[int, str]]) -> None:
+    """Each variant from a full decode of the photo, without `draft()`"""
+    for size, dst in variants:
+        with Image.open(src) as im:
+            im.load()
+            im = ImageOps.exif_transpose(im)
+            im = im.resize(_fit(im.size, size), Image.Resampling.BICUBIC)
+            im.save(dst, quality=95)
+
+
+def _fit(dims: tuple[int, int], size: int) -> tuple[int, int]:
+    scale = min(1, size / max(dims))
+    return round(dims[0] * scale), round(dims[1] * scale)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--width', type=int, default=6000)
+    argparser.add_argument('--height', type=int, default=4000)
+    argparser.add_argument('--repeat', type=int, default=3)
+    args = argparser.parse_args()
+
+    sizes = sorted(set(config.IMAGE_SIZES) | {config.THUMB_SIZE})
+    display = config.DISPLAY_SIZE or 2560
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A smooth gradient with noise, which compresses about as well as a photo
+        rng = np.random.default_rng(0)
+        y, x = np.mgrid[0:args.height, 0:args.width]
+        pixels = np.stack([x * 255 // args.width, y * 255 // args.height, (x + y) % 256], axis=-1)
+        pixels = np.clip(pixels + rng.normal(0, 12, pixels.shape), 0, 255).astype(np.uint8)
+        src = Path(tmp, 'photo.jpg')
+        Image.fromarray(pixels).save(src, quality=92)
+
+        variants = [(size, str(Path(tmp, f'{size}_photo.jpg'))) for size in sizes]
+        variants.append((display, str(Path(tmp, 'display_photo.jpg'))))
+
+        print(f'{args.width}x{args.height} photo, variants {", ".join(str(s) for s, _ in variants)}, best of {args.repeat}')
+        for name, generate in (('full decode', full_decode), ('draft', make_variants)):
+            timings = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                generate(str(src), variants)
+                timings.append(time.perf_counter() - t)
+            print(f'{name:>12}: {min(timings) * 1000:8.1f} ms')
+
+        print(f'{"original":>12}: {src.stat().st_size / 1024:8.0f} KiB')
+        for size, dst in variants:
+            print(f'{size:>12}: {Path(dst).stat().st_size / 1024:8.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Load-test the app as deployed: gunicorn serving `rounders:app` from a
+database of the seeded generator in `bench/data.py`, with a match-day mix
+of traffic from concurrent clients. Mostly the htmx requests of the teams
+and matches pages, some paging through the photos, and a trickle of scores
+posted by the admin.
+
+Reports the throughput, the p50/p95/p99 latency and errors of each kind of
+request, and how often the workers found the database locked, so that the
+number of workers can be chosen, and changes to concurrency checked,
+before a tournament rather than during one.
+
+Run from the repository root with
+    python -m bench.load [--workers 4] [--threads 1] [--clients 32] [--seconds 30]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import http.cookies
+import os
+import random
+import re
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from bench.data import Size
+
+MIX = {
+    'teams (hx)': 40,
+    'matches (hx)': 40,
+    'photos': 8,
+    'photos more (hx)': 4,
+    'home': 4,
+    'post score': 1,
+}
+"""Relative weights of the kinds of request made by the clients"""
+
+TIMEOUT = 30
+"""Seconds before a request counts as an error"""
+
+
+def serve():
+    """The app for gunicorn, loaded from the folder in `$BENCH_LOAD_FOLDER`"""
+    from bench.data import load_app
+    rounders = load_app(os.environ['BENCH_LOAD_FOLDER'])
+    return rounders.app
+
+
+def prepare(tmp: str, size: Size, seed: int) -> None:
+    """Generate the data, in a process of its own so that this one has no connection to the database"""
+    from bench.data import generate, load_app
+    generate(load_app(tmp), size, seed)
+
+
+# --------------------------------------------
+# Client
+
+@dataclass
+class Response:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+
+async def fetch(port: int, method: str, path: str, headers: dict[str, str] = {}, data: dict | None = None) -> Response:
+    """Make one HTTP/1.1 request on a new connection, as gunicorn's sync workers close each one"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        body = urllib.parse.urlencode(data).encode() if data is not None else b''
+        head = {'Host': f'127.0.0.1:{port}', 'Connection': 'close', 'Accept-Encoding': 'gzip'} | headers
+        if data is not None:
+            head |= {'Content-Type': 'application/x-www-form-urlencoded', 'Content-Length': str(len(body))}
+        writer.write(f'{method} {path} HTTP/1.1\r\n'.encode() + b''.join(f'{k}: {v}\r\n'.encode() for k, v in head.items()) + b'\r\n' + body)
+        await writer.drain()
+
+        raw = await reader.read()
+        head_raw, _, body = raw.partition(b'\r\n\r\n')
+        status_line, *header_lines = head_raw.decode('latin-1').split('\r\n')
+        response_headers = {}
+        for line in header_lines:
+            k, _, v = line.partition(':')
+            # Only the last Set-Cookie is kept, which is the session
+            response_headers[k.strip().lower()] = v.strip()
+        return Response(int(status_line.split()[1]), response_headers, body)
+    finally:
+        writer.close()
+
+
+async def login(port: int) -> str:
+    """The session cookie of the admin"""
+    r = await fetch(port, 'POST', '/login', data=dict(username='admin', password='bench'))
+    cookie = http.cookies.SimpleCookie(r.headers.get('set-cookie', ''))
+    if r.headers.get('location') != '/' or 'session' not in cookie:
+        raise RuntimeError('Could not log in as the admin')
+    return f'session={cookie["session"].value}'
+
+
+# --------------------------------------------
+# Traffic
+
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors:    dict[str, dict[str, int]] = field(default_factory=lambda: defaultdict(lambda: defaultdict(int)))
+
+
+class Client:
+    """One visitor, making requests of the mix one after another"""
+
+    def __init__(self, port: int, rng: random.Random, results: Results, session: str, match_ids: list[int], think: float):
+        self.port = port
+        self.rng = rng
+        self.results = results
+        self.session = session
+        self.match_ids = match_ids
+        self.think = think
+        self.more = None
+        """The next page of photos, from the last page of photos this client saw"""
+
+    async def request(self, kind: str, method: str, path: str, expect: int = 200, **kwargs) -> Response | None:
+        t = time.perf_counter()
+        try:
+            r = await asyncio.wait_for(fetch(self.port, method, path, **kwargs), TIMEOUT)
+        except asyncio.TimeoutError:
+            self.results.errors[kind]['timeout'] += 1
+            return None
+        except OSError as e:
+            self.results.errors[kind][type(e).__name__] += 1
+            return None
+        if r.status != expect:
+            self.results.errors[kind][f'HTTP {r.status}'] += 1
+            return None
+        self.results.latencies[kind].append(time.perf_counter() - t)
+        return r
+
+    async def photos(self, kind: str, path: str, headers: dict[str, str] = {}) -> None:
+        r = await self.request(kind, 'GET', path, headers=headers)
+        match = re.search(rb'class="more" hx-get="([^"]+)"', r.body) if r is not None else None
+        self.more = match.group(1).decode().replace('&amp;', '&') if match else None
+
+    async def step(self, kind: str) -> None:
+        hx = {'HX-Request': 'true'}
+        if kind == 'teams (hx)':
+            await self.request(kind, 'GET', '/teams/', headers=hx)
+        elif kind == 'matches (hx)':
+            await self.request(kind, 'GET', '/matches/', headers=hx)
+        elif kind == 'home':
+            await self.request(kind, 'GET', '/')
+        elif kind == 'post score':
+            await self.request(kind, 'POST', f'/matches/{self.rng.choice(self.match_ids)}/edit', expect=302, headers={'Cookie': self.session}, data=dict(
+                date='2026-07-01', time='18:00',
+                score1_in1=self.rng.randrange(8) / 2, score1_in2=self.rng.randrange(8) / 2,
+                score2_in1=self.rng.randrange(8) / 2, score2_in2=self.rng.randrange(8) / 2,
+            ))
+        elif kind == 'photos' or self.more is None:
+            # Uncompressed, to find the link to the next page
+            await self.photos('photos', '/photos', headers={'Accept-Encoding': 'identity'})
+        else:
+            await self.photos(kind, self.more, headers=hx | {'Accept-Encoding': 'identity'})
+
+    async def run(self, until: float) -> None:
+        kinds, weights = list(MIX), list(MIX.values())
+        while time.monotonic() < until:
+            await self.step(self.rng.choices(kinds, weights)[0])
+            if self.think:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+
+async def load(port: int, clients: int, seconds: float, think: float, match_ids: list[int], seed: int) -> Results:
+    results = Results()
+    session = await login(port)
+    until = time.monotonic() + seconds
+    await asyncio.gather(*(
+        Client(port, random.Random(seed + i), results, session, match_ids, think).run(until)
+        for i in range(clients)
+    ))
+    return results
+
+
+# --------------------------------------------
+# Server
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(port: int, server: subprocess.Popen, timeout: float = 30) -> None:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start')
+
+
+def percentile(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))] * 1000 if xs else float('nan')
+
+
+def report(results: Results, seconds: float, log: str) -> None:
+    print(f'{"request":<20} {"ok/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    everything = []
+    for kind in MIX:
+        latencies = results.latencies.get(kind, [])
+        everything += latencies
+        errors = sum(results.errors.get(kind, {}).values())
+        print(f'{kind:<20} {len(latencies) / seconds:>8.1f} {percentile(latencies, 50):>8.1f} '
+              f'{percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} {errors:>7}')
+    errors = sum(n for e in results.errors.values() for n in e.values())
+    print(f'{"total":<20} {len(everything) / seconds:>8.1f} {percentile(everything, 50):>8.1f} '
+          f'{percentile(everything, 95):>8.1f} {percentile(everything, 99):>8.1f} {errors:>7}')
+    if everything:
+        print(f'Error rate {errors / (errors + len(everything)):.2%}, mean latency {statistics.mean(everything) * 1000:.1f} ms')
+
+    for kind, e in results.errors.items():
+        for error, n in e.items():
+            print(f'    {kind}: {n} x {error}')
+    print(f'Database locked: {log.count("Database locked, retrying")} retries, '
+          f'{log.count("database is locked")} errors')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    argparser.add_argument('--threads', type=int, default=1, help='Threads in each worker, with the gthread worker if more than 1')
+    argparser.add_argument('--clients', type=int, default=32, help='Concurrent clients')
+    argparser.add_argument('--seconds', type=float, default=30)
+    argparser.add_argument('--think', type=float, default=0, help='Mean seconds each client waits between requests')
+    argparser.add_argument('--years', type=int, default=Size.years)
+    argparser.add_argument('--teams', type=int, default=Size.teams)
+    argparser.add_argument('--posts', type=int, default=30)
+    argparser.add_argument('--seed', type=int, default=0)
+    args = argparser.parse_args()
+
+    size = Size(years=args.years, teams=args.teams, posts=args.posts)
+    with tempfile.TemporaryDirectory() as tmp:
+        subprocess.run([sys.executable, '-c', f'from bench.load import prepare; from bench.data import Size; prepare({tmp!r}, Size(**{asdict(size)!r}), {args.seed})'], check=True)
+        # Scores are posted to the matches of the season being played
+        with contextlib.closing(sqlite3.connect(Path(tmp, 'bench.db'))) as connection:
+            match_ids = [id for id, in connection.execute(
+                'SELECT matches.id FROM matches JOIN teams ON teams.id = matches.team1_id '
+                'WHERE teams.year = (SELECT max(year) FROM teams)'
+            )]
+
+        from werkzeug.security import generate_password_hash
+        env = os.environ | dict(
+            BENCH_LOAD_FOLDER=tmp,
+            SECRET_KEY='bench',
+            ADMIN_PASSWORD_HASH=generate_password_hash('bench'),
+        )
+        port = free_port()
+        log_path = Path(tmp, 'gunicorn.log')
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen([
+                sys.executable, '-m', 'gunicorn', 'bench.load:serve()',
+                '--bind', f'127.0.0.1:{port}',
+                '--workers', str(args.workers),
+                '--threads', str(args.threads),
+                '--timeout', str(TIMEOUT),
+            ], env=env, stdout=log, stderr=subprocess.STDOUT)
+            try:
+                wait_until_up(port, server)
+                print(f'{args.clients} clients for {args.seconds:g}s against {args.workers} workers x {args.threads} threads, {asdict(size)}')
+                results = asyncio.run(load(port, args.clients, args.seconds, args.think, match_ids, args.seed))
+            finally:
+                server.terminate()
+                server.wait()
+        report(results, args.seconds, log_path.read_text())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Check that each page runs no more SQL statements than its budget,
+however much data there is, so that N+1 queries fail here rather
+than on match day. Each page is requested with a small database,
+and again once it has grown, with the response cache emptied.
+The pages read from the snapshot are measured once it has been
+rebuilt, and the rebuild is held to a budget of its own.
+
+Run from the repository root with
+    python -m bench.queries [--slow-ms 5] [--verbose]
+
+Exits with a non-zero status if a page is over its budget,
+or runs more statements with more data.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+from bench.data import load_app
+from bench.render import seed
+
+BUDGETS = {
+    '/': 1,
+    '/teams/': 1,
+    '/teams/?detailed=on&sortby=difference': 1,
+    '/teams/1/': 1,
+    '/matches/': 1,
+    '/matches/?groupby=winner': 1,
+    '/photos': 3,
+    '/photos?page=2': 4,
+    '/rules': 1,
+}
+"""Most SQL statements each public page may run"""
+
+ADMIN_BUDGETS = {
+    '/teams/create/': 2,
+    '/teams/1/edit': 3,
+    '/matches/create/': 2,
+    '/matches/1/edit/': 3,
+}
+"""Most SQL statements each admin page may run"""
+
+SNAPSHOT_BUDGET = 7
+"""Most SQL statements rebuilding the snapshot, which the pages above read from"""
+
+SNAPSHOT = '(snapshot rebuild)'
+
+
+def add_attachments(rounders) -> None:
+    """Attachments for the posts, without files, so that the photo pages load them"""
+    from rounders.blogs import Attachment, Entry
+    db = rounders.db
+    with rounders.app.app_context():
+        for e in db.session.scalars(db.select(Entry).where(~Entry.attachments.any())):
+            db.session.add_all([Attachment(blog_id=e.id, name=f'{e.id}_{i}.jpg') for i in range(3)])  # type: ignore
+        db.session.commit()
+
+
+def add_opponents(rounders) -> None:
+    """A match between the first team and every other, so that its pages grow with the data"""
+    from rounders.models import Match, Team
+    db = rounders.db
+    with rounders.app.app_context():
+        first = db.session.get(Team, 1)
+        for team in db.session.scalars(db.select(Team).where(Team.id != 1, ~Team.matches2.any(Match.team1_id == 1))):
+            db.session.add(Match(team1_id=first.id, team2_id=team.id, score1=2, score2=1))  # type: ignore
+        db.session.commit()
+
+
+def measure_snapshot(rounders) -> dict[str, list[str]]:
+    """The statements run rebuilding the snapshot, after the data has changed"""
+    from rounders import diagnostics, snapshot
+    with rounders.app.app_context(), diagnostics.count_queries() as s:
+        snapshot.refresh()
+    return {SNAPSHOT: s}
+
+
+def measure(rounders, client, pages: list[str]) -> dict[str, list[str]]:
+    """The statements run by each page"""
+    from rounders import cache, diagnostics
+    statements = {}
+    for page in pages:
+        cache.responses.clear()
+        with diagnostics.count_queries() as s:
+            r = client.get(page)
+        assert r.status_code == 200, (page, r.status_code)
+        statements[page] = s
+    return statements
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--slow-ms', type=float, default=None, help='Also log statements slower than this')
+    argparser.add_argument('--verbose', action='store_true', help='Print the statements of pages over budget')
+    args = argparser.parse_args()
+
+    from werkzeug.security import generate_password_hash
+    os.environ['ADMIN_PASSWORD_HASH'] = generate_password_hash('bench')
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        rounders = load_app(tmp)
+        import config
+        config.SLOW_QUERY_MS = args.slow_ms
+
+        public = rounders.app.test_client()
+        admin = rounders.app.test_client()
+        admin.post('/login', data=dict(username='admin', password='bench'))
+        budgets = {SNAPSHOT: SNAPSHOT_BUDGET} | BUDGETS | ADMIN_BUDGETS
+
+        runs = []
+        for n_teams, n_matches in ((6, 20), (60, 2000)):
+            seed(rounders, n_teams, n_matches)
+            add_attachments(rounders)
+            add_opponents(rounders)
+            runs.append(
+                measure_snapshot(rounders)
+                | measure(rounders, public, list(BUDGETS))
+                | measure(rounders, admin, list(ADMIN_BUDGETS))
+            )
+
+    small, large = runs
+    print(f'{"page":<40} {"small":>6} {"large":>6} {"budget":>6}')
+    for page, budget in budgets.items():
+        print(f'{page:<40} {len(small[page]):>6} {len(large[page]):>6} {budget:>6}')
+        over = max(len(small[page]), len(large[page])) > budget
+        grows = len(large[page]) > len(small[page])
+        if over:
+            failures.append(f'{page} over budget')
+        if grows:
+            failures.append(f'{page} runs more statements with more data')
+        if args.verbose and (over or grows):
+            for statement in max(small[page], large[page], key=len):
+                print('   ', ' '.join(statement.split())[:160])
+
+    for f in failures:
+        print('FAIL', f)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Time rendering the public pages from a database of synthetic matches,
+with the response cache emptied before every request.
+
+Run from the repository root with
+    python -m bench.render [--teams 60] [--matches 2000]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from bench.data import load_app
+
+
+def seed(rounders, n_teams: int, n_matches: int) -> None:
+    from rounders.blogs import Entry
+    from rounders.models import Match, Player, Team
+    db = rounders.db
+
+    rng = random.Random(0)
+    start = 1_749_056_400  # Wed 4 Jun 2025, 17:00 UTC
+    with rounders.app.app_context():
+        rounders.migrations.upgrade()
+        teams = [Team(name=f'Team {i}', year=2025) for i in range(n_teams)]  # type: ignore
+        db.session.add_all(teams)
+        db.session.flush()
+        db.session.add_all([
+            Player(team_id=t.id, name_first=f'First {j}', name_last=f'Last {j}')  # type: ignore
+            for t in teams for j in range(8)
+        ])
+        for _ in range(n_matches):
+            a, b = rng.sample(teams, 2)
+            played = rng.random() < 0.7
+            db.session.add(Match(
+                team1_id=a.id, team2_id=b.id,
+                score1=rng.randint(0, 20) / 2 if played else None,
+                score2=rng.randint(0, 20) / 2 if played else None,
+                play_date=None if rng.random() < 0.05 else start + 86400 * rng.randint(0, 90) + 3600 * rng.randint(0, 1),
+            ))  # type: ignore
+        db.session.add_all([Entry(title=f'Post {i}', text='Text', date=start + 86400 * i) for i in range(20)])  # type: ignore
+        db.session.commit()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--teams', type=int, default=60)
+    argparser.add_argument('--matches', type=int, default=2000)
+    argparser.add_argument('--repeat', type=int, default=10)
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rounders = load_app(tmp)
+        from rounders import cache
+        seed(rounders, args.teams, args.matches)
+
+        client = rounders.app.test_client()
+        pages = [
+            '/', '/teams/', '/teams/?detailed=on&sortby=difference', '/teams/1/',
+            '/matches/', '/matches/?groupby=winner', '/photos',
+        ]
+        print(f'{args.teams} teams, {args.matches} matches, best of {args.repeat}')
+        print(f'{"page":<40} {"ms":>8}')
+        for page in pages:
+            timings = []
+            for _ in range(args.repeat):
+                cache.responses.clear()
+                t = time.perf_counter()
+                r = client.get(page, headers={'hx-request': 'true'})
+                timings.append(time.perf_counter() - t)
+                assert r.status_code == 200, (page, r.status_code)
+            print(f'{page:<40} {min(timings) * 1000:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
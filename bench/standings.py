@@ -0,0 +1,110 @@
+"""
+Compare the time to compute every team's standings using the
+`Team` properties (ORM), the aggregate query, and the numpy kernel.
+
+Run from the repository root with
+    python -m bench.standings [--sizes 10000 100000 1000000]
+
+Uses a throwaway database of synthetic matches, never `config.DATABASE_FILE`.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import config
+
+
+def generate(db, Team, Match, num_matches: int, seed: int = 0) -> None:
+    """Fill the database with teams of 20 per year, each playing ~100 matches"""
+    rng = np.random.default_rng(seed)
+    teams_per_year = 20
+    num_teams = max(teams_per_year, (num_matches // 50) // teams_per_year * teams_per_year)
+    years = 2000 + np.arange(num_teams) // teams_per_year
+
+    db.session.execute(db.insert(Team), [
+        dict(id=i + 1, name=f'Team {i + 1}', year=int(y)) for i, y in enumerate(years)
+    ])
+
+    # Pairs of distinct teams within the same year
+    team1 = rng.integers(0, num_teams, num_matches)
+    offset = rng.integers(1, teams_per_year, num_matches)
+    team2 = team1 // teams_per_year * teams_per_year + (team1 % teams_per_year + offset) % teams_per_year
+
+    # ~10% unplayed, ~5% with a single score (DNF), and some draws
+    score1 = rng.integers(0, 12, num_matches) / 2
+    score2 = rng.integers(0, 12, num_matches) / 2
+    state = rng.random(num_matches)
+    score1[state < 0.1] = np.nan
+    score2[state < 0.15] = np.nan
+
+    def opt(x):
+        return None if np.isnan(x) else float(x)
+
+    db.session.execute(db.insert(Match), [
+        dict(team1_id=int(a) + 1, team2_id=int(b) + 1, score1=opt(s1), score2=opt(s2))
+        for a, b, s1, s2 in zip(team1, team2, score1, score2)
+    ])
+    db.session.commit()
+
+
+def timed(fn):
+    t = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t, result
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    argparser.add_argument('--orm-teams', type=int, default=200,
+                           help='Time the ORM path on at most this many teams, and extrapolate')
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.DATABASE_FILE = str(Path(tmp, 'bench.db'))
+
+        from rounders import app, db, columnar, migrations, standings
+        from rounders.models import Match, Team
+
+        with app.app_context():
+            migrations.upgrade()
+
+        print(f'{"matches":>10} {"teams":>7} {"orm (s)":>12} {"sql (s)":>9} {"numpy (s)":>10}')
+        extrapolated = False
+        for size in args.sizes:
+            with app.app_context():
+                db.session.execute(db.delete(Match))
+                db.session.execute(db.delete(Team))
+                db.session.commit()
+                generate(db, Team, Match, size)
+
+                t_sql, by_sql = timed(standings.compute_standings)
+                t_np, by_np = timed(columnar.compute_standings)
+                assert by_sql == by_np, 'numpy kernel disagrees with the aggregate query'
+
+                # The ORM path, via the properties of each team
+                teams = db.session.scalars(db.select(Team).order_by(Team.id).limit(args.orm_teams)).all()
+                t_orm, by_orm = timed(lambda: [
+                    (t.num_matches_played, t.num_wins, t.num_draws, t.num_losses,
+                     t.num_rounders_scored, t.num_rounders_conceded)
+                    for t in teams
+                ])
+                expected = [(s.played, s.wins, s.draws, s.losses, s.scored, s.conceded) for s in by_np]
+                assert by_orm == expected[:len(teams)], 'numpy kernel disagrees with the Team properties'
+                t_orm *= len(by_np) / max(len(teams), 1)
+                db.session.expunge_all()
+
+            extrapolated |= len(teams) < len(by_np)
+            orm = f'{t_orm:.3f}' + ('*' if len(teams) < len(by_np) else ' ')
+            print(f'{size:>10} {len(by_np):>7} {orm:>12} {t_sql:>9.3f} {t_np:>10.3f}')
+
+        if extrapolated:
+            print('* extrapolated from a subset of teams')
+
+
+if __name__ == '__main__':
+    main()
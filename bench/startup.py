@@ -0,0 +1,130 @@
+"""
+Time how long a new worker takes to start: importing the app,
+as measured by `python -X importtime`, and serving its first request.
+Also checks that the heavy libraries which only some routes need
+are not imported until then.
+
+The budgets are multiples of the time a fresh interpreter takes to
+import Flask and its extensions, measured alongside, so that they
+hold on a slower or busier machine.
+
+Run from the repository root with
+    python -m bench.startup [--import-budget 1.6] [--request-budget 0.5]
+
+Exits with a non-zero status if a budget is exceeded
+or a deferred library is imported at startup.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+DEFERRED = ('PIL.Image', 'dateutil.parser', 'pandas', 'numpy')
+"""Libraries which must not be imported by starting the app"""
+
+WORKER = '''
+import json, os, sys, time
+t0 = time.perf_counter()
+import config
+config.DATABASE_FILE = os.environ['BENCH_DB']
+config.DATA_VERSION_FILE = os.environ['BENCH_DATA_VERSION']
+import rounders
+t1 = time.perf_counter()
+loaded = [m for m in json.loads(os.environ['BENCH_DEFERRED']) if m in sys.modules]
+if os.environ.get('BENCH_UPGRADE'):
+    with rounders.app.app_context():
+        rounders.migrations.upgrade()
+t2 = time.perf_counter()
+status = rounders.app.test_client().get('/').status_code
+t3 = time.perf_counter()
+print(json.dumps(dict(import_ms=(t1 - t0) * 1000, request_ms=(t3 - t2) * 1000, status=status, loaded=loaded)))
+'''
+
+
+BASELINE = '''
+import json, time
+t0 = time.perf_counter()
+import flask, flask_login, flask_sqlalchemy
+print(json.dumps(dict(import_ms=(time.perf_counter() - t0) * 1000)))
+'''
+
+
+def run_baseline(env: dict) -> float:
+    """Time importing the framework alone in a fresh interpreter, in ms, as the app is timed"""
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', BASELINE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(p.stdout.strip().splitlines()[-1])['import_ms']
+
+
+def run_worker(env: dict, importtime: bool = False) -> tuple[dict, float | None]:
+    """Start a fresh interpreter, returning its timings, and the cumulative import time of `rounders` in ms"""
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', WORKER]
+    p = subprocess.run(args, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(p.stdout.strip().splitlines()[-1])
+    cumulative = None
+    for line in p.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if line.startswith('import time:') and line.rsplit('|', 1)[-1].strip() == 'rounders':
+            cumulative = int(line.split('|')[1]) / 1000
+    return result, cumulative
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--import-budget', type=float, default=1.6, help='Budget for importing the app, in multiples of the baseline')
+    argparser.add_argument('--request-budget', type=float, default=0.5, help='Budget for the first request, in multiples of the baseline')
+    argparser.add_argument('--repeat', type=int, default=5)
+    args = argparser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = os.environ | dict(
+            SECRET_KEY=os.environ.get('SECRET_KEY', 'bench'),
+            BENCH_DB=str(Path(tmp, 'bench.db')),
+            BENCH_DATA_VERSION=str(Path(tmp, 'data_version')),
+            BENCH_DEFERRED=json.dumps(DEFERRED),
+            PYTHONPATH=os.getcwd(),
+            PYTHONWARNINGS='ignore',
+        )
+        # Create the schema first, as a deployment would
+        run_worker(env | dict(BENCH_UPGRADE='1'))
+
+        # Alternately, so that both see the same load on the machine
+        runs = []
+        baselines = []
+        for _ in range(args.repeat):
+            baselines.append(run_baseline(env))
+            runs.append(run_worker(env, importtime=True))
+
+    import_ms = min(r[0]['import_ms'] for r in runs)
+    importtime_ms = min(r[1] for r in runs if r[1] is not None)
+    request_ms = min(r[0]['request_ms'] for r in runs)
+    loaded = sorted({m for r in runs for m in r[0]['loaded']})
+    baseline_ms = min(baselines)
+
+    print(f'best of {args.repeat}')
+    print(f'{"baseline (flask)":<24} {baseline_ms:8.1f} ms')
+    print(f'{"import (wall)":<24} {import_ms:8.1f} ms  {import_ms / baseline_ms:5.2f}x  (budget {args.import_budget:.2f}x)')
+    print(f'{"import (importtime)":<24} {importtime_ms:8.1f} ms')
+    print(f'{"first request":<24} {request_ms:8.1f} ms  {request_ms / baseline_ms:5.2f}x  (budget {args.request_budget:.2f}x)')
+    print(f'{"deferred but imported":<24} {", ".join(loaded) or "none"}')
+
+    if import_ms > args.import_budget * baseline_ms:
+        failures.append('import time over budget')
+    if request_ms > args.request_budget * baseline_ms:
+        failures.append('first request over budget')
+    if loaded:
+        failures.append(f'imported at startup: {", ".join(loaded)}')
+    if any(r[0]['status'] != 200 for r in runs):
+        failures.append('first request failed')
+
+    for f in failures:
+        print('FAIL', f)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Time every page, as a full page and as the fragment htmx requests, and the
+core computations behind them, on data from the seeded generator in
+`bench/data.py`. The response cache is emptied before every request.
+
+The timings are written as JSON, to compare between commits:
+    python -m bench.suite --output before.json
+    git checkout <other commit>
+    python -m bench.suite --output after.json --compare before.json
+
+Run from the repository root with
+    python -m bench.suite [--years 3] [--teams 12] [--posts 10] [--repeat 20]
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict
+
+from bench.data import Size, generate, load_app
+
+PER_PAGE = 5
+"""Posts on each page of photos, by default"""
+
+
+def pages(rounders, size: Size) -> tuple[list[str], list[str]]:
+    """The public and admin pages of every GET route, with ids from the generated data"""
+    import config
+    from rounders import db
+    from rounders.blogs import Entry
+    from rounders.models import Match, Team
+    with rounders.app.app_context():
+        team = db.session.scalars(db.select(Team).order_by(Team.year.desc(), Team.id)).first()
+        match = db.session.scalars(db.select(Match).order_by(Match.id.desc())).first()
+        entry = db.session.scalars(db.select(Entry).order_by(Entry.date.desc())).first()
+        team_id, match_id, entry_id = team.id, match.id, entry.id  # type: ignore
+
+    public = [
+        '/', '/rules',
+        '/teams/', f'/teams/?year={config.LAST_COMPLETE_YEAR}', '/teams/?detailed=on&sortby=difference',
+        f'/teams/{team_id}/',
+        '/matches/', '/matches/?groupby=date', '/matches/?groupby=name1', '/matches/?groupby=winner',
+        f'/matches/?year={config.LAST_COMPLETE_YEAR}',
+        '/photos', f'/photos/{entry_id}/download.zip',
+    ]
+    # Only if there are more posts than fit on the first page
+    if size.posts > PER_PAGE:
+        public.append('/photos?page=2')
+    admin = ['/teams/create/', f'/teams/{team_id}/edit', '/matches/create/', f'/matches/{match_id}/edit/']
+    return public, admin
+
+
+def timings(fn, repeat: int) -> dict[str, float]:
+    """Summary of the times of `repeat` calls of `fn`, in ms"""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    return dict(
+        min_ms=round(times[0], 3),
+        median_ms=round(statistics.median(times), 3),
+        p90_ms=round(times[min(len(times) - 1, int(0.9 * len(times)))], 3),
+    )
+
+
+def time_pages(rounders, client, urls: list[str], repeat: int) -> dict[str, dict]:
+    from rounders import cache
+    results = {}
+    for url in urls:
+        variants = {'': {}} if url.endswith('.zip') else {'': {}, ' (hx)': {'hx-request': 'true'}}
+        for suffix, headers in variants.items():
+            def get():
+                cache.responses.clear()
+                r = client.get(url, headers=headers)
+                assert r.status_code == 200, (url, r.status_code)
+                r.close()
+            results[f'GET {url}{suffix}'] = timings(get, repeat)
+    return results
+
+
+def time_core(rounders, repeat: int) -> dict[str, dict]:
+    """The computations behind the pages, outside of a request"""
+    import config
+    from rounders import db, seasons, standings
+    from rounders import formatting as fmt
+    from rounders.models import Match, Team
+    from rounders.table import Table
+
+    results = {}
+    with rounders.app.app_context():
+        year = config.LAST_COMPLETE_YEAR
+        results['standings.compute_standings'] = timings(standings.compute_standings, repeat)
+        results['standings.standings (stored)'] = timings(lambda: standings.standings(year), repeat)
+        results['seasons.summarise'] = timings(lambda: seasons.summarise(year), repeat)
+
+        def team_properties():
+            # Fresh objects, as the properties are cached on each
+            db.session.expunge_all()
+            for t in db.session.scalars(db.select(Team).where(Team.year == year)):
+                (t.num_matches_played, t.num_points, t.net_rounders)
+        results['Team properties'] = timings(team_properties, repeat)
+
+        dates = db.session.scalars(db.select(Match.play_date)).all()
+        played = [d is not None and i % 3 > 0 for i, d in enumerate(dates)]
+
+        def build():
+            return Table(dict(
+                week      = fmt.week_names(dates),
+                week_key  = fmt.sort_keys(fmt.week_starts(dates)),
+                date      = fmt.date_names(dates),
+                date_key  = fmt.sort_keys(dates),
+                time      = fmt.time_names(dates),
+                played    = played,
+            ))
+        table = build()
+        results['formatting columns'] = timings(build, repeat)
+        results['formatting.grouped by week'] = timings(
+            lambda: [list(g) for _, g in fmt.grouped(table.sort_values('date_key'), 'week_key', 'week_key', 'week')],
+            repeat,
+        )
+    return results
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict]) -> None:
+    print(f'{"":<56} {"before":>9} {"after":>9} {"change":>8}')
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median_ms'], r['median_ms']
+        print(f'{name:<56} {before:>9.2f} {after:>9.2f} {(after - before) / before * 100:>+7.1f}%')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for field, default in asdict(Size()).items():
+        argparser.add_argument(f'--{field}', type=int, default=default)
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--repeat', type=int, default=20)
+    argparser.add_argument('--output', help='Write the results to this JSON file')
+    argparser.add_argument('--compare', help='Compare the median times with those in this JSON file')
+    args = argparser.parse_args()
+
+    size = Size(**{f: getattr(args, f) for f in asdict(Size())})
+    with tempfile.TemporaryDirectory() as tmp:
+        rounders = load_app(tmp)
+        generate(rounders, size, seed=args.seed)
+
+        public, admin = pages(rounders, size)
+        client = rounders.app.test_client()
+        admin_client = rounders.app.test_client()
+        admin_client.post('/login', data=dict(username='admin', password='bench'))
+
+        results = (
+            time_pages(rounders, client, public, args.repeat)
+            | time_pages(rounders, admin_client, admin, args.repeat)
+            | time_core(rounders, args.repeat)
+        )
+
+    print(f'{asdict(size)}, seed {args.seed}, {args.repeat} runs')
+    print(f'{"":<56} {"min ms":>9} {"median":>9} {"p90":>9}')
+    for name, r in results.items():
+        print(f'{name:<56} {r["min_ms"]:>9.2f} {r["median_ms"]:>9.2f} {r["p90_ms"]:>9.2f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(
+                commit=commit(),
+                date=datetime.datetime.now().isoformat(timespec='seconds'),
+                python=platform.python_version(),
+                size=asdict(size),
+                seed=args.seed,
+                repeat=args.repeat,
+                results=results,
+            ), f, indent=2)
+        print(f'Wrote {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,127 @@ THUMB_SIZE = 800
 Maximum size of thumbnails
 """
 
+IMAGE_SIZES = (320, 800, 1600)
+"""
+Maximum sizes of the variants generated of each photo, which browsers
+choose between for its thumbnail. `THUMB_SIZE` is always generated.
+Run `flask backfill-thumbs --all` after changing this.
+"""
+
+DISPLAY_SIZE = None
+"""
+If set, e.g. to 2560, a copy of each photo shrunk to fit within this size
+is linked to instead of the original upload, which may be up to 20MB
+"""
+
+THUMB_WORKERS = 2
+"""
+Number of processes generating thumbnails in the background,
+in each worker of the web server
+"""
+
 LAST_COMPLETE_YEAR = 2025
 """
 The latest year which has been played.
+Run `flask freeze-seasons` after changing this.
+"""
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 64 * 1024 * 1024,
+    'cache_size': -16 * 1024,
+}
+"""
+Pragmas set on every connection to the database.
+WAL lets readers continue while a score is being written,
+`busy_timeout` (ms) makes writers wait for the lock rather than fail,
+and a negative `cache_size` is in KiB.
+"""
+
+SQLITE_CHECKPOINT_INTERVAL = 300
+"""
+Seconds between explicit checkpoints of the WAL, which are attempted
+after write requests. Stops the WAL growing when there is always a reader.
+`None` leaves it to SQLite's automatic checkpoints.
+"""
+
+SQLITE_READONLY_GETS = False
+"""
+Serve GET requests through separate read-only connections,
+so that they can never take the write lock.
+"""
+
+WRITE_RETRIES = 5
+"""
+Number of attempts at a write request that fails because the
+database is locked, backing off exponentially from `WRITE_RETRY_DELAY` seconds.
+"""
+
+WRITE_RETRY_DELAY = 0.05
+
+RESPONSE_CACHE_SIZE = 256
+"""
+Maximum number of rendered pages kept in memory by each worker.
+Pages are only cached for visitors who are not logged in.
+"""
+
+DATA_VERSION_FILE = "data_version"
+"""
+Memory-mapped file through which workers share the latest data version,
+relative to the Flask `app.instance_path` directory.
+"""
+
+DATA_VERSION_RECHECK = 30
+"""
+Seconds between checks of the data version file against the database,
+in case the database was changed by another program.
+"""
+
+ASSETS_FOLDER = "assets"
+"""
+Where fingerprinted and precompressed copies of the stylesheets, scripts
+and images are built, relative to the Flask `app.instance_path` directory
+"""
+
+METRICS = True
+"""
+Record the timings of every request, served to Prometheus by `/admin/metrics`
+"""
+
+METRICS_FOLDER = "metrics"
+"""
+Where each worker writes its metrics, so that they can be added together,
+relative to the Flask `app.instance_path` directory.
+`None` to only serve the metrics of the worker handling the request.
+"""
+
+METRICS_FLUSH_INTERVAL = 10
+"""
+Seconds between writes of the metrics of each worker
+"""
+
+SLOW_QUERY_MS = None
+"""
+If set, e.g. to 50, SQL statements slower than this many milliseconds
+are logged with their query plan and the line which ran them
+"""
+
+SERVER_TIMING = False
+"""
+Send the timings of each response in a `Server-Timing` header,
+shown by the developer tools of browsers
+"""
+
+SHARED_RESPONSE_CACHE_FILE = None
+"""
+SQLite database in which rendered pages are shared between workers,
+relative to the Flask `app.instance_path` directory, e.g. "cache.db".
+`None` to only cache pages in the memory of each worker.
+"""
+
+SHARED_RESPONSE_CACHE_SIZE = 1024
+"""
+Maximum number of pages kept in the shared response cache
 """
@@ -1,7 +1,8 @@
-from rounders import db, app
+from rounders import app, migrations
 
 with app.app_context():
-    db.create_all()
+    for m in migrations.upgrade():
+        print(f'applied migration {m.version}: {m.name}')
 
 print('created')
 exit(0)
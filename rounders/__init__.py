@@ -6,11 +6,14 @@ The Flask server and SQLite database
 from dotenv import load_dotenv
 load_dotenv()
 
+import sqlite3
+from functools import cache
 from pathlib import Path
 
-from flask import Flask
+from flask import Flask, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import event
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 
@@ -22,9 +25,8 @@ import config
 app = Flask(__name__, template_folder='templates', static_folder='static', static_url_path='')
 # Limit content upload size to 20MB
 app.config['MAX_CONTENT_LENGTH'] = 20 * 1000 * 1000
-# Create attachments folder for blogs
+# Attachments folder for blogs, created when the first is uploaded
 app.config['ATTACHMENTS_FOLDER'] = Path(app.root_path, 'static/attachments')
-app.config['ATTACHMENTS_FOLDER'].mkdir(parents=True, exist_ok=True)
 
 
 # --------------------------------------------
@@ -34,19 +36,57 @@ class ModelBase(DeclarativeBase):
     """Base class for models"""
     pass
 
+
+class RoutingSession(Session):
+    """
+    Session which uses read-only connections for GET requests,
+    if `config.SQLITE_READONLY_GETS` is set
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            config.SQLITE_READONLY_GETS
+            and bind is None
+            and not self._flushing
+            and has_request_context()
+            and request.method in ('GET', 'HEAD')
+        ):
+            return _readonly_engine()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
 # Initialise database
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{config.DATABASE_FILE}"
-db = SQLAlchemy(app=app, model_class=ModelBase)
+db = SQLAlchemy(app=app, model_class=ModelBase, session_options=dict(class_=RoutingSession))
 
-# Enable foreign key checks when connecting
+
+@cache
+def _readonly_engine() -> Engine:
+    """Engine opening the same database file in read-only mode"""
+    path = db.engine.url.database
+    return create_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+
+
+# Enable foreign key checks and apply the storage profile when connecting
 @event.listens_for(Engine, "connect")
 def _set_sqlite_pragma(dbapi_connection, _):
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA foreign_keys=ON;")
+    for name, value in config.SQLITE_PRAGMAS.items():
+        try:
+            cursor.execute(f"PRAGMA {name}={value};")
+        except sqlite3.OperationalError:
+            # e.g. the journal mode cannot be changed by a read-only connection
+            pass
     cursor.close()
 
 
 # --------------------------------------------
 # Import submodules
 
-from . import auth, blogs, models, routes
+# The schema is created and updated by `flask db-upgrade`,
+# see the `migrations` package
+
+# Metrics first, so that they time everything the other request hooks do
+from . import metrics
+from . import assets, auth, blogs, cache, database, diagnostics, models, standings, seasons, snapshot, migrations, thumbnails, routes
@@ -0,0 +1,173 @@
+"""
+Fingerprinted and precompressed copies of the static assets.
+
+Each stylesheet, script and image is copied to `config.ASSETS_FOLDER`
+under a name containing the hash of its contents, with gzip (and brotli,
+if installed) compressed copies of those which compress well. Pages
+link to them through `asset_url()`, and as the URL changes whenever the
+file does, browsers can cache them forever.
+
+The copies are made by `flask build-assets`, or by the first request
+after an asset has changed. Until they exist, pages link to the originals.
+"""
+
+from __future__ import annotations
+
+import functools
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from pathlib import Path
+
+import click
+from flask import abort, request, send_from_directory
+
+import config
+
+from . import app
+
+ASSETS = ('styles/*', 'scripts/*', 'images/*', 'favicons/*')
+"""Files in the static folder which are fingerprinted"""
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.xml', '.json', '.webmanifest')
+"""Suffixes of the assets which are worth compressing, unlike PNGs"""
+
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+"""Suffixes of the precompressed copies, in order of preference"""
+
+MAX_AGE = 365 * 24 * 3600
+
+
+def _folder() -> Path:
+    return Path(app.instance_path, config.ASSETS_FOLDER)
+
+
+def _sources() -> list[Path]:
+    static = Path(app.static_folder) # type: ignore
+    return sorted(p for pattern in ASSETS for p in static.glob(pattern) if p.is_file())
+
+
+def _compress(data: bytes) -> dict[str, bytes]:
+    """The compressed copies of `data`, by encoding"""
+    encoded = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        encoded['br'] = brotli.compress(data)
+    except ImportError:
+        pass
+    return encoded
+
+
+def _write(path: Path, data: bytes) -> None:
+    """Replace the file at `path` atomically, as other workers may be reading it"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.asset-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build() -> dict[str, dict]:
+    """
+    Copy each asset under its fingerprinted name, with its compressed copies,
+    and write the manifest of them. Returns the manifest.
+    """
+    static = Path(app.static_folder) # type: ignore
+    folder = _folder()
+    manifest = {}
+    for src in _sources():
+        name = src.relative_to(static).as_posix()
+        data = src.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        fingerprinted = Path(name).with_suffix(f'.{digest}{src.suffix}').as_posix()
+
+        dst = Path(folder, fingerprinted)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        _write(dst, data)
+        encodings = []
+        if src.suffix in COMPRESSIBLE:
+            for encoding, compressed in _compress(data).items():
+                # Not worth a separate copy if it hardly saves anything
+                if len(compressed) < 0.9 * len(data):
+                    _write(Path(folder, fingerprinted + ENCODINGS[encoding]), compressed)
+                    encodings.append(encoding)
+        manifest[name] = dict(path=fingerprinted, encodings=encodings)
+
+    folder.mkdir(parents=True, exist_ok=True)
+    _write(Path(folder, 'manifest.json'), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+@functools.cache
+def manifest() -> dict[str, dict]:
+    """The fingerprinted assets by original path, built first if any asset is newer"""
+    path = Path(_folder(), 'manifest.json')
+    try:
+        built = path.stat().st_mtime
+        if all(src.stat().st_mtime <= built for src in _sources()):
+            return json.loads(path.read_text())
+    except (OSError, ValueError):
+        pass
+    try:
+        return build()
+    except OSError as e:
+        app.logger.warning(f'Could not build the static assets, linking to the originals: {e}')
+        return {}
+
+
+@functools.cache
+def _originals() -> dict[str, tuple[str, list[str]]]:
+    """The original path and encodings of each fingerprinted asset"""
+    return {a['path']: (name, a['encodings']) for name, a in manifest().items()}
+
+
+@functools.cache
+def version() -> str:
+    """Identifies the built assets, which change the URLs in every page"""
+    paths = sorted(a['path'] for a in manifest().values())
+    return hashlib.sha256(repr(paths).encode()).hexdigest()[:12]
+
+
+@app.template_global()
+def asset_url(name: str) -> str:
+    """URL of the static file `name`, fingerprinted if it has been built"""
+    asset = manifest().get(name)
+    if asset is None:
+        return f'/{name}'
+    return f'/assets/{asset["path"]}'
+
+
+@app.route('/assets/<path:name>')
+def route_asset(name: str):
+    """A fingerprinted asset, precompressed if the browser accepts it, cached forever"""
+    original, encodings = _originals().get(name, (None, []))
+    if original is None:
+        abort(404)
+
+    filename, encoding = name, None
+    for e in ENCODINGS:
+        if e in encodings and e in request.accept_encodings:
+            filename, encoding = name + ENCODINGS[e], e
+            break
+
+    response = send_from_directory(
+        _folder(), filename,
+        mimetype=mimetypes.guess_type(original)[0] or 'application/octet-stream',
+        max_age=MAX_AGE,
+    )
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the static assets, e.g. when deploying"""
+    built = build()
+    compressed = sum(1 for a in built.values() if a['encodings'])
+    click.echo(f'Built {len(built)} assets, {compressed} precompressed, in {_folder()}')
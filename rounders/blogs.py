@@ -4,17 +4,27 @@ Data models for blog posts in the database
 
 from __future__ import annotations
 
+import mimetypes
+import re
 import warnings
 from pathlib import Path
 from typing import Optional
 
-from PIL import Image
+import click
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 import config
 
-from . import app, db
+from . import app, db, filestore
+
+THUMB_PENDING = 'pending'
+THUMB_READY = 'ready'
+THUMB_FAILED = 'failed'
+"""States of the thumbnail of an attachment"""
+
+THUMB_PLACEHOLDER = 'images/thumb_placeholder.svg'
+"""Shown until the thumbnail of an attachment is ready, relative to the static folder"""
 
 
 class Attachment(db.Model):
@@ -24,9 +34,21 @@ class Attachment(db.Model):
 
     # Columns
     id:      Mapped[int] = mapped_column(primary_key=True, nullable=False)
-    blog_id: Mapped[int] = mapped_column(ForeignKey('blogs.id'), nullable=True)
-    name:    Mapped[str] = mapped_column(nullable=False)
-    """Filename of this attachment"""
+    blog_id: Mapped[int] = mapped_column(ForeignKey('blogs.id'), nullable=True, index=True)
+    name:    Mapped[str] = mapped_column(nullable=False, index=True)
+    """Filename of this attachment, named by the hash of its contents, shared by attachments of the same photo"""
+    thumb_state: Mapped[str] = mapped_column(nullable=False, default=THUMB_PENDING, server_default=THUMB_PENDING)
+    """Whether the thumbnail and other variants have been generated, by `thumbnails.queue()`"""
+    width:   Mapped[Optional[int]] = mapped_column(nullable=True)
+    """Width of the photo the right way up, known once its variants have been generated"""
+    height:  Mapped[Optional[int]] = mapped_column(nullable=True)
+    """Height of the photo the right way up, known once its variants have been generated"""
+    path:    Mapped[Optional[str]] = mapped_column(nullable=True)
+    """URL of the file relative to the static folder, None if it is not in the attachments folder"""
+    size:    Mapped[Optional[int]] = mapped_column(nullable=True)
+    """Size of the file in bytes"""
+    content_type: Mapped[Optional[str]] = mapped_column(nullable=True)
+    """MIME type of the file"""
 
     # Relationships
     blog:  Mapped['Entry'] = relationship(back_populates='attachments')
@@ -41,41 +63,155 @@ class Attachment(db.Model):
             return None
         return p
 
+    def _variantpath(self, size: int) -> Optional[Path]:
+        """Path to the copy of this attachment shrunk to fit within `size` pixels"""
+        if self._filepath is None:
+            return None
+        return Path(self._filepath.parent, f'{size}_{self._filepath.name}')
+
     @property
-    def _thumbpath(self) -> Optional[Path]:
+    def _displaypath(self) -> Optional[Path]:
+        """Path to the copy linked to instead of the original, if `config.DISPLAY_SIZE` is set"""
         if self._filepath is None:
             return None
-        return Path(self._filepath.parent, 'thumb_' + self._filepath.name)
+        return Path(self._filepath.parent, 'display_' + self._filepath.name)
 
-    def _create_thumb(self) -> None:
-        """Generate a thumbnail for this attachment, if it doesn't exist"""
-        if (not self._filepath) or self._thumbpath.exists():
-            return
-        im = Image.open(self._filepath)
-        im.thumbnail((config.THUMB_SIZE, config.THUMB_SIZE))
-        im.save(self._thumbpath.as_posix(), quality=95)
-        print(f'Generated thumbnail for attachment {self.name}')
+    @property
+    def _variantpaths(self) -> list[tuple[int, Path]]:
+        """The size and path of each variant to generate"""
+        if self._filepath is None:
+            return []
+        paths = [(size, self._variantpath(size)) for size in variant_sizes()]
+        if config.DISPLAY_SIZE:
+            paths.append((config.DISPLAY_SIZE, self._displaypath))
+        return paths # type: ignore
+
+    @staticmethod
+    def references(name: str) -> int:
+        """Number of attachments sharing the file `name`"""
+        return db.session.scalar(db.select(db.func.count()).where(Attachment.name == name)) or 0
 
     def delete(self) -> None:
-        if self._filepath:
+        """
+        Delete the file of this attachment and its variants, once the attachment
+        has been deleted from the database, unless another attachment shares it
+        """
+        if not self._filepath:
+            return
+        with filestore.lock(self._filepath.parent):
+            if Attachment.references(self.name):
+                app.logger.info(f'Kept attachment {self.name}, which is shared')
+                return
             self._filepath.unlink(missing_ok=True)
-            self._thumbpath.unlink(missing_ok=True)
-            print(f'Deleted attachment {self.name}')
+            for _, p in self._variantpaths:
+                p.unlink(missing_ok=True)
+            # From before variants of several sizes were generated
+            Path(self._filepath.parent, 'thumb_' + self._filepath.name).unlink(missing_ok=True)
+        app.logger.info(f'Deleted attachment {self.name}')
+
+    def record_file(self, size: int) -> None:
+        """
+        Check the file of this attachment once, when it is stored, and record
+        what pages need to link to it, so that they never touch the disk
+        """
+        p = self._filepath
+        self.path = None if p is None else p.relative_to(app.static_folder).as_posix()
+        self.size = size
+        self.content_type = mimetypes.guess_type(self.name)[0]
+
+    def _url(self, prefix: str) -> str:
+        """URL of the variant of this attachment with the filename prefix `prefix`"""
+        folder, _, name = self.path.rpartition('/') # type: ignore
+        return f'{folder}/{prefix}{name}'
 
     @property
     def url(self) -> Optional[str]:
-        """Relative URL of this attachment"""
-        if not self._filepath:
+        """Relative URL of this attachment, shrunk to `config.DISPLAY_SIZE` if that is set"""
+        if not self.path:
             return None
-        return self._filepath.relative_to(app.static_folder).as_posix()
+        if config.DISPLAY_SIZE and self.thumb_state == THUMB_READY:
+            return self._url('display_')
+        return self.path
 
     @property
     def thumb(self) -> Optional[str]:
-        """Relative URL of the thumbnail"""
-        if not self._filepath:
+        """Relative URL of the thumbnail, or of a placeholder until it has been generated"""
+        if not self.path:
+            return None
+        if self.thumb_state != THUMB_READY:
+            return THUMB_PLACEHOLDER
+        return self._url(f'{config.THUMB_SIZE}_')
+
+    @property
+    def srcset(self) -> Optional[str]:
+        """
+        The variants of the thumbnail for the `srcset` of an `<img>`,
+        so that browsers can download the smallest that will look sharp
+        """
+        if not self.path or self.thumb_state != THUMB_READY or not self.width or not self.height:
             return None
-        self._create_thumb()
-        return self._thumbpath.relative_to(app.static_folder).as_posix()
+        scale = max(self.width, self.height)
+        candidates = []
+        for size in variant_sizes():
+            candidates.append(f'{self._url(f"{size}_")} {round(self.width * min(1, size / scale))}w')
+            # Any larger variants are the same size as this one, the whole photo,
+            # and a width may only be given once
+            if size >= scale:
+                break
+        return ', '.join(candidates)
+
+
+def variant_sizes() -> list[int]:
+    """Sizes of the variants generated of each attachment, smallest first"""
+    return sorted(set(config.IMAGE_SIZES) | {config.THUMB_SIZE})
+
+
+@app.cli.command('check-attachments')
+@click.option('--fix', is_flag=True, help='Record the files as they are, and regenerate missing variants')
+def check_attachments_command(fix: bool):
+    """Check the file of every attachment against what was recorded when it was stored"""
+    folder = app.config['ATTACHMENTS_FOLDER']
+    known = set()
+    problems = 0
+    for a in db.session.scalars(db.select(Attachment)):
+        found = []
+        p = a._filepath
+        expected_path = None if p is None else p.relative_to(app.static_folder).as_posix()
+        if a.path != expected_path:
+            found.append(f'path is {a.path}, expected {expected_path}')
+        if p is not None and not p.exists():
+            found.append('file is missing')
+        elif p is not None:
+            known.update([p.name] + [v.name for _, v in a._variantpaths])
+            size = p.stat().st_size
+            if a.size != size:
+                found.append(f'size is {a.size}, file is {size} bytes')
+            if a.content_type != mimetypes.guess_type(a.name)[0]:
+                found.append(f'content type is {a.content_type}')
+            stem = p.name.split('.', 1)[0]
+            if re.fullmatch('[0-9a-f]{64}', stem) and filestore.file_hash(p) != stem:
+                found.append('contents do not match the name')
+            if a.thumb_state == THUMB_READY and not all(v.exists() for _, v in a._variantpaths):
+                found.append('variants are missing')
+                if fix:
+                    a.thumb_state = THUMB_PENDING
+            if fix:
+                a.record_file(size)
+        if fix and p is None:
+            a.path = None
+
+        for f in found:
+            click.echo(f'Attachment {a.id} ({a.name}): {f}')
+        problems += len(found)
+
+    orphans = [p.name for p in folder.glob('*') if p.is_file() and not p.name.startswith('.') and p.name not in known] if folder.exists() else []
+    for name in sorted(orphans):
+        click.echo(f'Not used by any attachment: {name}')
+
+    if fix:
+        db.session.commit()
+        click.echo('Recorded the files as they are, run `flask backfill-thumbs` for any missing variants')
+    click.echo(f'Checked attachments, found {problems} problems and {len(orphans)} unused files')
 
 
 class Entry(db.Model):
@@ -89,7 +225,7 @@ class Entry(db.Model):
     """Title of the blog"""
     text:  Mapped[Optional[str]] = mapped_column(nullable=True)
     """Text content of the blog"""
-    date:  Mapped[int] = mapped_column(nullable=False)
+    date:  Mapped[int] = mapped_column(nullable=False, index=True)
     """Unix epoch representing the date of the blog"""
 
     # Relationships
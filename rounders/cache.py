@@ -0,0 +1,396 @@
+"""
+Caching of rendered public pages, on the server and in browsers.
+
+Pages only change when an admin writes to the database, so each
+rendered response is valid until the data version changes. The version
+is shared between gunicorn workers through a memory-mapped file, so that
+a write handled by one worker invalidates the caches of all of them.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import functools
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Hashable
+
+from flask import Response, g, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+import config
+
+from . import app, assets, db
+
+CACHE_ARGS = ('year', 'sortby', 'detailed', 'groupby', 'page', 'per_page', 'cursor')
+"""Query parameters which change the content of a cached page"""
+
+
+# --------------------------------------------
+# Data version
+
+@dataclass(frozen=True)
+class DataVersion:
+    version:    int
+    """Incremented by every transaction which changes the database"""
+    updated_at: int
+    """Unix epoch of the last change"""
+
+
+class VersionFile:
+    """
+    The latest data version, shared between worker processes through a
+    memory-mapped file, so that it can be checked without a query
+    """
+
+    _FORMAT = struct.Struct('<qq')
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._mmap: mmap.mmap | None = None
+
+    def _map(self) -> mmap.mmap:
+        if self._mmap is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < self._FORMAT.size:
+                    os.ftruncate(fd, self._FORMAT.size)
+                self._mmap = mmap.mmap(fd, self._FORMAT.size)
+            finally:
+                os.close(fd)
+        return self._mmap
+
+    def read(self) -> DataVersion | None:
+        """The published version, if any"""
+        version, updated_at = self._FORMAT.unpack_from(self._map())
+        return DataVersion(version, updated_at) if version > 0 else None
+
+    def publish(self, dv: DataVersion, force: bool = False) -> None:
+        """Record `dv`, unless a newer version has already been published"""
+        self._map()
+        with open(self.path, 'rb') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            current = self.read()
+            if force or current is None or dv.version > current.version:
+                self._FORMAT.pack_into(self._map(), 0, dv.version, dv.updated_at)
+
+
+@functools.cache
+def version_file() -> VersionFile:
+    return VersionFile(Path(app.instance_path, config.DATA_VERSION_FILE))
+
+
+_last_db_check = 0.0
+
+def _read_db_version() -> DataVersion:
+    row = db.session.execute(text("SELECT version, updated_at FROM data_version")).one()
+    return DataVersion(*row)
+
+
+def data_version() -> DataVersion:
+    """
+    The current data version, read once per request from the version file.
+    Checked against the database every `config.DATA_VERSION_RECHECK` seconds,
+    in case the database was changed by something other than this app.
+    """
+    global _last_db_check
+    if 'data_version' not in g:
+        dv = version_file().read()
+        if dv is None or time.monotonic() - _last_db_check > config.DATA_VERSION_RECHECK:
+            _last_db_check = time.monotonic()
+            stored = _read_db_version()
+            # Only go backwards if the database itself did, e.g. was restored from a backup.
+            # Pages shared under the old version numbers can't be trusted either.
+            if dv is None or stored.version < dv.version:
+                if shared_responses() is not None:
+                    shared_responses().clear()
+            version_file().publish(stored, force=dv is not None and stored.version < dv.version)
+            # The file can't hold version 0, of a database which has never been written to
+            dv = version_file().read() or stored
+        g.data_version = dv
+    return g.data_version
+
+
+@event.listens_for(db.session, "after_flush")
+def _bump_data_version(session: Session, _):
+    """Increment the data version in the same transaction as the first change"""
+    if (session.new or session.dirty or session.deleted) and 'data_version' not in session.info:
+        row = session.connection().execute(
+            text("UPDATE data_version SET version = version + 1, updated_at = :now RETURNING version, updated_at"),
+            dict(now=int(time.time())),
+        ).one()
+        session.info['data_version'] = DataVersion(*row)
+
+@event.listens_for(db.session, "after_commit")
+def _publish_data_version(session: Session):
+    """Let the other workers know that their cached pages are out of date"""
+    dv = session.info.pop('data_version', None)
+    if dv is not None:
+        version_file().publish(dv)
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_data_version(session: Session):
+    session.info.pop('data_version', None)
+
+
+def bump(connection: Connection) -> DataVersion | None:
+    """
+    Increment the data version for a change written with core statements
+    rather than through the ORM session, such as by a command or migration.
+    If `connection` is that of the session, it is published when the session
+    commits, otherwise the caller must publish it once `connection` has.
+    Does nothing before the `data_version` table has been created.
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_version'")
+    ).first()
+    if exists is None:
+        return None
+    row = connection.execute(
+        text("UPDATE data_version SET version = version + 1, updated_at = :now RETURNING version, updated_at"),
+        dict(now=int(time.time())),
+    ).one()
+    dv = DataVersion(*row)
+    session = db.session()
+    if session.in_transaction() and session.connection() is connection:
+        session.info['data_version'] = dv
+    return dv
+
+
+# --------------------------------------------
+# Response cache
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body:     bytes
+    status:   int
+    mimetype: str
+
+
+class ResponseCache:
+    """
+    LRU cache of at most `size` responses,
+    emptied whenever the data version moves on
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: int) -> bool:
+        """Move on to `version` if it is newer, returns whether it is current"""
+        if version > self._version:
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, key: Hashable, version: int) -> CachedResponse | None:
+        with self._lock:
+            if not self._check_version(version):
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, entry: CachedResponse, version: int) -> None:
+        with self._lock:
+            # Don't store a page rendered from data that has since changed
+            if not self._check_version(version):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedResponseCache:
+    """
+    Responses stored in a separate SQLite database, shared by every
+    worker process, so that a worker with an empty `ResponseCache`
+    doesn't have to render pages which another has already rendered
+    """
+
+    def __init__(self, path: Path, size: int) -> None:
+        self.path = path
+        self.size = size
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key BLOB NOT NULL PRIMARY KEY, "
+                "version INTEGER NOT NULL, "
+                "body BLOB NOT NULL, "
+                "status INTEGER NOT NULL, "
+                "mimetype VARCHAR NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key: Hashable) -> bytes:
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+
+    def get(self, key: Hashable, version: int) -> CachedResponse | None:
+        try:
+            row = self._connection().execute(
+                "SELECT body, status, mimetype FROM responses WHERE key = ? AND version = ?",
+                (self._key(key), version),
+            ).fetchone()
+        except sqlite3.Error:
+            # The shared cache is only an optimisation
+            return None
+        return CachedResponse(*row) if row else None
+
+    def put(self, key: Hashable, entry: CachedResponse, version: int) -> None:
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, version, body, status, mimetype) VALUES (?, ?, ?, ?, ?)",
+                (self._key(key), version, entry.body, entry.status, entry.mimetype),
+            )
+            # Drop responses from older versions, and keep to the size limit
+            conn.execute("DELETE FROM responses WHERE version < ?", (version,))
+            conn.execute(
+                "DELETE FROM responses WHERE rowid NOT IN "
+                "(SELECT rowid FROM responses ORDER BY rowid DESC LIMIT ?)",
+                (self.size,),
+            )
+        except sqlite3.Error:
+            pass
+
+    def clear(self) -> None:
+        try:
+            self._connection().execute("DELETE FROM responses")
+        except sqlite3.Error:
+            pass
+
+
+responses = ResponseCache(config.RESPONSE_CACHE_SIZE)
+
+@functools.cache
+def shared_responses() -> SharedResponseCache | None:
+    if config.SHARED_RESPONSE_CACHE_FILE is None:
+        return None
+    return SharedResponseCache(
+        Path(app.instance_path, config.SHARED_RESPONSE_CACHE_FILE),
+        config.SHARED_RESPONSE_CACHE_SIZE,
+    )
+
+
+def request_variant() -> tuple:
+    """The parts of the request which select what is rendered"""
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple((k, tuple(request.args.getlist(k))) for k in CACHE_ARGS),
+        bool(request.headers.get('hx-request')),
+        # Pages link to the assets by their fingerprint
+        assets.version(),
+    )
+
+
+def cacheable() -> bool:
+    """
+    Whether the response to this request may be shared with other visitors.
+    Admins see edit controls, and pending flashed messages are only for this visitor.
+    """
+    return (
+        request.method == 'GET'
+        and not current_user.is_authenticated
+        and '_flashes' not in session
+    )
+
+
+def cached_response(view):
+    """Serve a public GET route from the response cache where possible"""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not cacheable():
+            return view(*args, **kwargs)
+
+        key = request_variant()
+        version = data_version().version
+        shared = shared_responses()
+
+        entry = responses.get(key, version)
+        if entry is None and shared is not None:
+            entry = shared.get(key, version)
+            if entry is not None:
+                responses.put(key, entry, version)
+        if entry is not None:
+            return Response(entry.body, status=entry.status, mimetype=entry.mimetype)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            entry = CachedResponse(response.get_data(), response.status_code, response.mimetype)
+            responses.put(key, entry, version)
+            if shared is not None:
+                shared.put(key, entry, version)
+        return response
+
+    return wrapper
+
+
+# --------------------------------------------
+# Conditional requests
+
+def etag() -> str:
+    """Identifies the content of the response to this request"""
+    variant = (data_version().version, request_variant(), current_user.is_authenticated)
+    return hashlib.blake2b(repr(variant).encode(), digest_size=12).hexdigest()
+
+
+def conditional(view):
+    """
+    Add an ETag to the response of a GET route, and respond with
+    304 Not Modified if the client already has it, before the route runs
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Pages showing a flashed message can't be reused
+        if request.method != 'GET' or '_flashes' in session:
+            return view(*args, **kwargs)
+
+        tag = etag()
+        if tag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(tag)
+        response.last_modified = data_version().updated_at
+        response.cache_control.no_cache = True
+        response.vary.update(('HX-Request', 'Cookie'))
+        return response
+
+    return wrapper
@@ -0,0 +1,133 @@
+"""
+Vectorised standings, computed with numpy from the
+matches loaded as columns rather than as `Match` objects.
+Intended for bulk and historical computations over every year.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.engine import Connection
+
+from . import db
+from .models import Match, Team
+from .standings import Standing
+
+
+@dataclass(frozen=True)
+class MatchColumns:
+    """Every match, as one array per column"""
+    team1_id: np.ndarray
+    team2_id: np.ndarray
+    score1:   np.ndarray
+    """Score of team 1, NaN if NULL"""
+    score2:   np.ndarray
+    """Score of team 2, NaN if NULL"""
+    year:     np.ndarray
+    """Year of team 1"""
+
+    @classmethod
+    def load(cls, connection: Optional[Connection] = None) -> MatchColumns:
+        """Fetch every match in a single query"""
+        query = (
+            db
+            .select(Match.team1_id, Match.team2_id, Match.score1, Match.score2, Team.year)
+            .join(Team, Team.id == Match.team1_id)
+        )
+        # Bypass SQLAlchemy's result rows, which dominate the cost for large tables.
+        # NULL scores become NaN when converted to floats.
+        connection = connection or db.session.connection()
+        cursor = connection.connection.cursor()
+        try:
+            rows = cursor.execute(str(query.compile(dialect=connection.dialect))).fetchall()
+        finally:
+            cursor.close()
+        table = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        return cls(
+            team1_id = table[:, 0].astype(np.int64),
+            team2_id = table[:, 1].astype(np.int64),
+            score1   = table[:, 2],
+            score2   = table[:, 3],
+            year     = table[:, 4].astype(np.int64),
+        )
+
+
+def standings_kernel(team_ids: np.ndarray, matches: MatchColumns) -> dict[str, np.ndarray]:
+    """
+    The standings of each of the (sorted, unique) `team_ids`, as one array per
+    column of `Standing`. Same semantics as `Match.played` and `Match.winner`,
+    where a NULL score counts as -1.
+    """
+    n = len(team_ids)
+    idx1 = np.searchsorted(team_ids, matches.team1_id)
+    idx2 = np.searchsorted(team_ids, matches.team2_id)
+
+    null1 = np.isnan(matches.score1)
+    null2 = np.isnan(matches.score2)
+    played = ~(null1 & null2)
+    s1 = np.where(null1, -1, matches.score1)
+    s2 = np.where(null2, -1, matches.score2)
+    draw = played & (s1 == s2)
+
+    def count(mask1, mask2):
+        """Number of matches where `mask1` holds for team 1, or `mask2` for team 2"""
+        return (
+            np.bincount(idx1[mask1], minlength=n)
+            + np.bincount(idx2[mask2], minlength=n)
+        )
+
+    def total(weights1, weights2):
+        return (
+            np.bincount(idx1, weights=weights1, minlength=n)
+            + np.bincount(idx2, weights=weights2, minlength=n)
+        )
+
+    # A NULL score counts as zero rounders
+    r1 = np.where(null1, 0, matches.score1)
+    r2 = np.where(null2, 0, matches.score2)
+
+    return dict(
+        played   = count(played, played),
+        wins     = count(s1 > s2, s2 > s1),
+        draws    = count(draw, draw),
+        losses   = count(s1 < s2, s2 < s1),
+        scored   = total(r1, r2),
+        conceded = total(r2, r1),
+    )
+
+
+def compute_standings(year: Optional[int] = None, connection: Optional[Connection] = None) -> list[Standing]:
+    """
+    As `standings.compute_standings()`, but vectorised over the matches of every year.
+    """
+    query = db.select(Team.id, Team.name, Team.year).order_by(Team.id)
+    if year is not None:
+        query = query.where(Team.year == year)
+    teams = (connection or db.session).execute(query).all()
+
+    # Standings are computed for all teams, so that every match has a valid index
+    all_ids = np.asarray(
+        (connection or db.session).execute(db.select(Team.id).order_by(Team.id)).scalars().all(),
+        dtype=np.int64,
+    )
+    stats = standings_kernel(all_ids, MatchColumns.load(connection))
+    stats = {k: v.tolist() for k, v in stats.items()}
+
+    idx = np.searchsorted(all_ids, [t.id for t in teams]).tolist()
+    return [
+        Standing(
+            id       = t.id,
+            name     = t.name,
+            year     = t.year,
+            played   = stats['played'][i],
+            wins     = stats['wins'][i],
+            draws    = stats['draws'][i],
+            losses   = stats['losses'][i],
+            scored   = stats['scored'][i],
+            conceded = stats['conceded'][i],
+        )
+        for t, i in zip(teams, idx)
+    ]
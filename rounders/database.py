@@ -0,0 +1,64 @@
+"""
+Helpers for sharing the SQLite database between several
+gunicorn workers, as configured by the storage profile in `config.py`
+"""
+
+import functools
+import random
+import time
+
+from flask import request
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import config
+
+from . import app, db
+
+
+def is_locked_error(e: OperationalError) -> bool:
+    """Whether the error was caused by another connection holding the lock"""
+    return 'database is locked' in str(e.orig) or 'database is busy' in str(e.orig)
+
+
+def retry_on_locked(view):
+    """
+    Retry a write route with exponential backoff if the database is locked.
+    The route must make all its changes in a single commit,
+    so that a failed attempt leaves nothing behind.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        for attempt in range(config.WRITE_RETRIES):
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as e:
+                if not is_locked_error(e) or attempt == config.WRITE_RETRIES - 1:
+                    raise
+                db.session.rollback()
+                delay = config.WRITE_RETRY_DELAY * 2 ** attempt
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                app.logger.warning(f'Database locked, retrying {request.path} (attempt {attempt + 2})')
+    return wrapper
+
+
+_last_checkpoint = time.monotonic()
+
+@app.after_request
+def _checkpoint(response):
+    """Checkpoint the WAL every `config.SQLITE_CHECKPOINT_INTERVAL` seconds, after a write"""
+    global _last_checkpoint
+    if (
+        config.SQLITE_CHECKPOINT_INTERVAL is None
+        or request.method in ('GET', 'HEAD')
+        or time.monotonic() - _last_checkpoint < config.SQLITE_CHECKPOINT_INTERVAL
+    ):
+        return response
+
+    _last_checkpoint = time.monotonic()
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+    except OperationalError as e:
+        app.logger.warning(f'WAL checkpoint failed: {e}')
+    return response
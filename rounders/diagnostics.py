@@ -0,0 +1,92 @@
+"""
+Diagnostics of the SQL run by the app.
+
+With `config.SLOW_QUERY_MS` set, every statement slower than it is
+logged with its `EXPLAIN QUERY PLAN` and the line of the app, or of
+a template, which ran it. `count_queries()` records the statements
+run within a block, so that checks such as `bench/queries.py` can
+hold each route to a budget.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import time
+import traceback
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+
+from . import app
+
+_PACKAGE = str(Path(__file__).parent)
+
+_counters: list[list[str]] = []
+
+
+def call_site() -> str:
+    """The innermost line of the app or its templates in the current stack"""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(_PACKAGE) and frame.filename != __file__:
+            return f'{Path(frame.filename).relative_to(Path(_PACKAGE).parent)}:{frame.lineno} in {frame.name}'
+    return 'outside the app'
+
+
+def query_plan(connection, statement: str, parameters) -> list[str]:
+    """The `EXPLAIN QUERY PLAN` of a statement, indented as its tree"""
+    cursor = connection.connection.cursor()
+    try:
+        rows = cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    except Exception as e:
+        return [f'(no query plan: {e})']
+    finally:
+        cursor.close()
+
+    depth = {0: 0}
+    lines = []
+    for id, parent, _, detail in rows:
+        depth[id] = depth.get(parent, 0) + 1
+        lines.append('  ' * depth[id] + detail)
+    return lines
+
+
+@contextlib.contextmanager
+def count_queries() -> Iterator[list[str]]:
+    """Record the statements run within the block, in the list it yields"""
+    statements: list[str] = []
+    _counters.append(statements)
+    try:
+        yield statements
+    finally:
+        _counters.remove(statements)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(connection, cursor, statement, parameters, context, executemany):
+    for statements in _counters:
+        statements.append(statement)
+    # On the context of this execution, which is dropped with it if the statement fails
+    if config.SLOW_QUERY_MS is not None and context is not None:
+        context._diagnostics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(connection, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_diagnostics_start', None)
+    if config.SLOW_QUERY_MS is None or start is None:
+        return
+    ms = (time.perf_counter() - start) * 1000
+    if ms < config.SLOW_QUERY_MS:
+        return
+
+    plan = [] if executemany else query_plan(connection, statement, parameters)
+    app.logger.warning('\n'.join([
+        f'Slow query ({ms:.1f} ms) at {call_site()}:',
+        statement,
+        f'Parameters: {parameters}',
+        *plan,
+    ]))
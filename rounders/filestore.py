@@ -0,0 +1,104 @@
+"""
+Content-addressed storage of uploaded attachments.
+
+Each upload is streamed in chunks to a temporary file while it is hashed,
+then moved into place under a name made from its hash. The same photo
+uploaded twice is stored once, and shared by both attachments, which count
+as references to it (see `Attachment.references`).
+
+Storing a file and committing its attachment, and counting the references
+to a file and deleting it, are done holding the `lock()` of the folder, so
+that a file is never deleted as another attachment of it is added.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import hashlib
+import mimetypes
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+CHUNK_SIZE = 64 * 1024
+"""Bytes read from an upload at a time, so memory use does not grow with its size"""
+
+HASH = 'sha256'
+
+LOCK_FILE = '.lock'
+"""File in the folder locked by `lock()`"""
+
+
+@dataclass(frozen=True)
+class Stored:
+    name: str
+    """Name of the file in the folder"""
+    size: int
+    """Size of the file in bytes"""
+    new:  bool
+    """Whether the file was created, rather than already stored"""
+
+
+@contextlib.contextmanager
+def lock(folder: Path) -> Iterator[None]:
+    """
+    Hold the lock of `folder`, shared by every thread and worker process,
+    from checking which attachments use a file until they have been changed
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    with open(Path(folder, LOCK_FILE), 'a') as f:
+        # Released when the file is closed
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def extension(ext: str) -> str:
+    """The usual extension of files of the type of `ext`, e.g. `jpg` for `jpeg`"""
+    content_type = mimetypes.guess_type(f'file.{ext.lower()}')[0]
+    usual = content_type and mimetypes.guess_extension(content_type)
+    return usual[1:] if usual else ext.lower()
+
+
+def store(stream: BinaryIO, folder: Path, ext: str) -> Stored:
+    """
+    Save the contents of `stream` to `folder`, named by their hash and the
+    usual extension of their type. Call holding the `lock()` of `folder`.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    # Read from the start, as a retried request will have read it before
+    stream.seek(0)
+    digest = hashlib.new(HASH)
+    size = 0
+
+    # In the same folder, so that it can be moved into place atomically
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while chunk := stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                size += f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        name = f'{digest.hexdigest()}.{extension(ext)}'
+        path = Path(folder, name)
+        if path.exists():
+            os.unlink(tmp)
+            return Stored(name, size, new=False)
+        os.replace(tmp, path)
+        return Stored(name, size, new=True)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def file_hash(path: Path) -> str:
+    """Hash of the contents of the file at `path`, as used for its name by `store()`"""
+    digest = hashlib.new(HASH)
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -3,9 +3,12 @@ from datetime import datetime, UTC
 from abc import ABC, abstractmethod
 from datetime import timedelta
 import functools
-from typing import Any, Optional
+from typing import Any, Iterable, Optional, TypeVar
 
 from .models import Team
+from .table import Table
+
+V = TypeVar('V')
 
 @functools.total_ordering
 class FormatAs(ABC):
@@ -13,27 +16,24 @@ class FormatAs(ABC):
     A field that can be sorted by `._sort_value`,
     grouped by `._group_value`, and displayed as
     per `._name`.
+    These are all computed once, on construction, as
+    pandas compares and hashes each field many times
+    when sorting and grouping.
     Note: Do not inherit with a dataclass, as this
     overrides the needed `.__hash__()` method.
     """
 
-    def __init__(self, sort_reverse: bool = False) -> None:
-        self._reverse = sort_reverse
+    __slots__ = ('_sort_value', '_group_value', '_name', '_reverse')
 
-    @property
     @abstractmethod
-    def _sort_value(self) -> Any:
+    def __init__(self, sort_value: Any, group_value: Any, name: str, sort_reverse: bool = False) -> None:
+        self._sort_value = sort_value
         """Value to sort the items by"""
-
-    @property
-    @abstractmethod
-    def _group_value(self) -> Any:
+        self._group_value = group_value
         """Value to group the items by"""
-
-    @property
-    @abstractmethod
-    def _name(self) -> str:
+        self._name = name
         """Text used to display each item"""
+        self._reverse = sort_reverse
 
     def __str__(self) -> str:
         return self._name
@@ -66,118 +66,165 @@ class FormatAs(ABC):
 
 class AsScore(FormatAs):
 
+    __slots__ = ('score',)
+
     def __init__(self, score: Optional[float], sort_reverse: bool = False):
         self.score = score
-        super().__init__(sort_reverse=sort_reverse)
+        sort_value = -1 if score is None else score
+        name = '--' if score is None else f'{score:.1f}'
+        super().__init__(sort_value, sort_value, name, sort_reverse=sort_reverse)
 
-    @property
-    def _sort_value(self) -> float:
-        return -1 if self.score is None else self.score
 
-    @property
-    def _group_value(self) -> Optional[float]:
-        return self._sort_value
-
-    @property
-    def _name(self) -> str:
-        if self.score is None:
-            return '--'
-        else:
-            return f'{self.score:.1f}'
+@functools.lru_cache(maxsize=4096)
+def _strftime(timestamp: int, fmt: str) -> str:
+    """Format a UTC timestamp, memoised as the same few dates appear many times"""
+    return datetime.fromtimestamp(timestamp, UTC).strftime(fmt)
 
 
 class AsDateTime(FormatAs):
     """A datetime with custom formatting"""
 
+    __slots__ = ('timestamp', 'fmt')
+
+    _null_name = ''
+    """Displayed if there is no timestamp"""
+
     def __init__(self, timestamp: Optional[int], fmt: str, newest_first: bool = True):
         self.timestamp = timestamp
         self.fmt = fmt
-        super().__init__(newest_first)
+        name = self._null_name if timestamp is None else self._format(timestamp)
+        sort_value = -1 if timestamp is None else timestamp
+        super().__init__(sort_value, name, name, newest_first)
 
-    @property
-    def _sort_value(self) -> Optional[int]:
-        return -1 if self.timestamp is None else self.timestamp
+    def _format(self, timestamp: int) -> str:
+        return _strftime(timestamp, self.fmt)
 
-    @property
-    def _group_value(self) -> Any:
-        return self._name
+class AsDate(AsDateTime):
 
-    @property
-    def _name(self) -> str:
-        if self.timestamp is None: return ''
-        return datetime.fromtimestamp(self.timestamp, UTC).strftime(self.fmt)
+    __slots__ = ()
 
-class AsDate(AsDateTime):
+    _null_name = 'TBC'
 
     def __init__(self, timestamp: Optional[int], newest_first: bool = True, with_year: bool = False):
         fmt = '%a %d %b'
         if with_year: fmt += ' %Y'
         super().__init__(timestamp, fmt, newest_first=newest_first)
 
-    @property
-    def _name(self) -> str:
-        if self.timestamp is None: return 'TBC'
-        return super()._name
-
 class AsTime(AsDateTime):
 
+    __slots__ = ()
+
     def __init__(self, timestamp: Optional[int], newest_first: bool = True):
         super().__init__(timestamp, '%H:%M', newest_first=newest_first)
 
 class AsDateInput(AsDateTime):
     """Formats a date for an `<input type="date">` HTML element"""
 
+    __slots__ = ()
+
     def __init__(self, timestamp: Optional[int]):
         super().__init__(timestamp, '%Y-%m-%d')
 
 class AsTimeInput(AsDateTime):
     """Formats a time for an `<input type="time">` HTML element"""
 
+    __slots__ = ()
+
     def __init__(self, timestamp: Optional[int]):
         super().__init__(timestamp, '%H:%M')
 
+
+@functools.lru_cache(maxsize=4096)
+def _week_start(timestamp: int) -> int:
+    """Timestamp of midnight UTC on the Monday of the (local) week containing `timestamp`"""
+    d = datetime.fromtimestamp(timestamp)
+    monday = d - timedelta(days = d.weekday())
+    return int(datetime(monday.year, monday.month, monday.day, tzinfo=UTC).timestamp())
+
 class AsWeekOf(AsDate):
     """Represents the start of the week containing `timestamp`"""
 
+    __slots__ = ()
+
+    _null_name = 'Date TBC'
+
     def __init__(self, timestamp: Optional[int], newest_first: bool = True):
-        if timestamp == None:
-            return super().__init__(None, newest_first=newest_first)
-        else:
-            d = datetime.fromtimestamp(timestamp)
-            monday = d - timedelta(days = d.weekday())
-            ts = int(datetime(monday.year, monday.month, monday.day, tzinfo=UTC).timestamp())
-            super().__init__(ts, newest_first=newest_first)
+        super().__init__(None if timestamp is None else _week_start(timestamp), newest_first=newest_first)
 
-    @property
-    def _name(self) -> str:
-        if self.timestamp is None: return 'Date TBC'
-        return 'Week of ' + super()._name
+    def _format(self, timestamp: int) -> str:
+        return 'Week of ' + super()._format(timestamp)
 
 
 class AsTeamName(FormatAs):
     """Allow sorting/grouping by team"""
 
+    __slots__ = ('team',)
+
     def __init__(self, team: Optional[Team], sort_reverse: bool = False):
         self.team = team
-        super().__init__(sort_reverse)
-
-    @property
-    def _group_value(self) -> int:
-        if self.team is None:
-            return -1
-        return self.team.id
-
-    @property
-    def _sort_value(self) -> str:
-        if self.team is None:
-            return ""
-        return self.team.name
-
-    @property
-    def _name(self) -> str:
-        if self.team is None:
-            return "Unknown"
-        return self.team.name
+        super().__init__(
+            sort_value  = "" if team is None else team.name,
+            group_value = -1 if team is None else team.id,
+            name        = "Unknown" if team is None else team.name,
+            sort_reverse = sort_reverse,
+        )
+
+
+# --------------------------------------------
+# Columnar formatting
+#
+# Wrapping every cell in a `FormatAs` makes large tables slow to sort
+# and group, one Python comparison at a time. Instead, tables can keep
+# the values themselves, with a missing value as -1 like the
+# `._sort_value` of each class above, to sort and group by,
+# and format each column for display all at once.
+
+def sort_keys(values: Iterable[Optional[V]]) -> list[V | int]:
+    """Values to sort and group by, with missing values as -1"""
+    return [-1 if v is None else v for v in values]
+
+
+def score_names(scores: Iterable[Optional[float]]) -> list[str]:
+    """Display each score as `AsScore` would"""
+    return ['--' if s is None else f'{s:.1f}' for s in scores]
+
+
+def datetime_names(timestamps: Iterable[Optional[int]], fmt: str, null_name: str = '') -> list[str]:
+    """Display each timestamp as `AsDateTime` would"""
+    return [null_name if t is None else _strftime(t, fmt) for t in timestamps]
+
+def date_names(timestamps: Iterable[Optional[int]], with_year: bool = False) -> list[str]:
+    return datetime_names(timestamps, '%a %d %b %Y' if with_year else '%a %d %b', null_name='TBC')
+
+def time_names(timestamps: Iterable[Optional[int]]) -> list[str]:
+    return datetime_names(timestamps, '%H:%M')
+
+
+def week_starts(timestamps: Iterable[Optional[int]]) -> list[Optional[int]]:
+    """The start of the week containing each timestamp, as in `AsWeekOf`"""
+    return [None if t is None else _week_start(t) for t in timestamps]
+
+def week_names(timestamps: Iterable[Optional[int]]) -> list[str]:
+    """Display the week containing each timestamp as `AsWeekOf` would"""
+    return [
+        'Date TBC' if t is None else 'Week of ' + _strftime(t, '%a %d %b')
+        for t in week_starts(timestamps)
+    ]
+
+
+def team_names(names: Iterable[Optional[str]]) -> list[str]:
+    """Display each team name as `AsTeamName` would"""
+    return ['Unknown' if n is None else n for n in names]
+
+
+def grouped(table: Table, by: str, order_by: str, label: str, descending: bool = False) -> list[tuple[str, Table]]:
+    """
+    Split `table` into groups of rows with the same `by`, keeping their order.
+    The groups are ordered by `order_by`, and labelled by `label`, of their first row.
+    """
+    groups = [(next(iter(rows)), rows) for _, rows in table.groupby(by)]
+    groups.sort(key=lambda g: g[0][order_by], reverse=descending)
+    return [(first[label], rows) for first, rows in groups]
 
 
 def basic_sanitisation(s: str) -> str:
@@ -0,0 +1,268 @@
+"""
+Timings of every request, by endpoint, exposed to Prometheus.
+
+Each request records its wall time, the number and total time of its SQL
+statements, and the time spent rendering templates. The rest of its time
+is spent in Python, mostly building and formatting tables. The timings
+are added to per-endpoint totals and a histogram of latency, which
+`/admin/metrics` serves in the Prometheus text format.
+
+Each worker keeps its own totals, and every `config.METRICS_FLUSH_INTERVAL`
+seconds writes them to `config.METRICS_FOLDER`, from which the metrics of
+all workers are added together. With `config.SERVER_TIMING` the timings
+of each response are also sent in a `Server-Timing` header, for the
+browser's developer tools.
+"""
+
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+
+from . import app
+from .auth import login
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Upper bounds of the latency histogram, in seconds"""
+
+
+@dataclass
+class Timings:
+    """What one request spent its time on, in seconds"""
+    start:       float = field(default_factory=time.perf_counter)
+    sql_count:   int = 0
+    sql_time:    float = 0
+    render_time: float = 0
+
+
+@dataclass
+class EndpointStats:
+    """Totals of the timings of every request to an endpoint"""
+    buckets:     list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+    count:       int = 0
+    total_time:  float = 0
+    sql_count:   int = 0
+    sql_time:    float = 0
+    render_time: float = 0
+    app_time:    float = 0
+
+    def add(self, other: EndpointStats) -> None:
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total_time += other.total_time
+        self.sql_count += other.sql_count
+        self.sql_time += other.sql_time
+        self.render_time += other.render_time
+        self.app_time += other.app_time
+
+
+_stats: dict[str, EndpointStats] = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _timings() -> Timings | None:
+    if not config.METRICS or not has_request_context():
+        return None
+    return g.get('timings')
+
+
+# --------------------------------------------
+# Recording
+
+@app.before_request
+def _start():
+    if config.METRICS:
+        g.timings = Timings()
+
+
+# The start is kept on the context of each execution, which is
+# dropped with it if the statement fails
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(connection, cursor, statement, parameters, context, executemany):
+    if context is not None and _timings() is not None:
+        context._metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(connection, cursor, statement, parameters, context, executemany):
+    timings = _timings()
+    start = getattr(context, '_metrics_start', None)
+    if timings is not None and start is not None:
+        timings.sql_count += 1
+        timings.sql_time += time.perf_counter() - start
+
+
+@before_render_template.connect_via(app)
+def _before_render(sender, template, context, **extra):
+    if _timings() is not None:
+        g.render_start = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def _after_render(sender, template, context, **extra):
+    timings = _timings()
+    if timings is not None and 'render_start' in g:
+        timings.render_time += time.perf_counter() - g.pop('render_start')
+
+
+@app.after_request
+def _finish(response: Response) -> Response:
+    timings = _timings()
+    if timings is None:
+        return response
+
+    total = time.perf_counter() - timings.start
+    app_time = max(0, total - timings.sql_time - timings.render_time)
+    with _lock:
+        stats = _stats.setdefault(request.endpoint or 'none', EndpointStats())
+        stats.count += 1
+        stats.total_time += total
+        stats.sql_count += timings.sql_count
+        stats.sql_time += timings.sql_time
+        stats.render_time += timings.render_time
+        stats.app_time += app_time
+        for i, le in enumerate(BUCKETS):
+            if total <= le:
+                stats.buckets[i] += 1
+                break
+
+    if config.SERVER_TIMING:
+        response.headers['Server-Timing'] = ', '.join((
+            f'sql;dur={timings.sql_time * 1000:.1f};desc="{timings.sql_count} queries"',
+            f'render;dur={timings.render_time * 1000:.1f}',
+            f'app;dur={app_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    _flush()
+    return response
+
+
+# --------------------------------------------
+# Sharing between workers
+
+def _folder() -> Path | None:
+    if config.METRICS_FOLDER is None:
+        return None
+    return Path(app.instance_path, config.METRICS_FOLDER)
+
+
+def _snapshot() -> dict[str, EndpointStats]:
+    with _lock:
+        return {e: EndpointStats(**asdict(s)) for e, s in _stats.items()}
+
+
+def _flush(force: bool = False) -> None:
+    """Write the totals of this worker for the others, at most every `config.METRICS_FLUSH_INTERVAL` seconds"""
+    global _last_flush
+    folder = _folder()
+    if folder is None or (not force and time.monotonic() - _last_flush < config.METRICS_FLUSH_INTERVAL):
+        return
+    _last_flush = time.monotonic()
+
+    data = json.dumps({e: asdict(s) for e, s in _snapshot().items()})
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp, Path(folder, f'{os.getpid()}.json'))
+    except OSError as e:
+        app.logger.warning(f'Could not write metrics: {e}')
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Another user's process
+        return True
+    return True
+
+
+def collect() -> dict[str, EndpointStats]:
+    """
+    The totals of every running worker. The files of workers which have
+    exited are removed, so the counters reset as workers are restarted,
+    as Prometheus expects of a counter.
+    """
+    merged = _snapshot()
+    folder = _folder()
+    if folder is None or not folder.exists():
+        return merged
+    for path in folder.glob('*.json'):
+        if path.stem == str(os.getpid()):
+            continue
+        if path.stem.isdigit() and not _alive(int(path.stem)):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            stats = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for endpoint, s in stats.items():
+            merged.setdefault(endpoint, EndpointStats()).add(EndpointStats(**s))
+    return merged
+
+
+# --------------------------------------------
+# Prometheus
+
+def prometheus(stats: dict[str, EndpointStats]) -> str:
+    """The metrics in the Prometheus text exposition format"""
+    lines = []
+
+    def metric(name: str, type: str, help: str) -> None:
+        lines.append(f'# HELP rounders_{name} {help}')
+        lines.append(f'# TYPE rounders_{name} {type}')
+
+    metric('request_duration_seconds', 'histogram', 'Time to handle a request, by endpoint')
+    for endpoint, s in sorted(stats.items()):
+        cumulative = 0
+        for le, n in zip(BUCKETS, s.buckets):
+            cumulative += n
+            lines.append(f'rounders_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}')
+        lines.append(f'rounders_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {s.count}')
+        lines.append(f'rounders_request_duration_seconds_sum{{endpoint="{endpoint}"}} {s.total_time:.6f}')
+        lines.append(f'rounders_request_duration_seconds_count{{endpoint="{endpoint}"}} {s.count}')
+
+    for name, attr, help in (
+        ('sql_statements_total', 'sql_count', 'SQL statements executed, by endpoint'),
+        ('sql_seconds_total', 'sql_time', 'Time spent executing SQL statements, by endpoint'),
+        ('render_seconds_total', 'render_time', 'Time spent rendering templates, by endpoint'),
+        ('app_seconds_total', 'app_time', 'Time spent in Python outside SQL and templates, such as building tables, by endpoint'),
+    ):
+        metric(name, 'counter', help)
+        for endpoint, s in sorted(stats.items()):
+            value = getattr(s, attr)
+            lines.append(f'rounders_{name}{{endpoint="{endpoint}"}} {value if isinstance(value, int) else f"{value:.6f}"}')
+
+    return '\n'.join(lines) + '\n'
+
+
+@app.route('/admin/metrics')
+def route_metrics():
+    """The metrics, for the admin, or for Prometheus with `Authorization: Bearer $METRICS_TOKEN`"""
+    token = os.environ.get('METRICS_TOKEN')
+    bearer = token is not None and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (bearer or current_user.is_authenticated):
+        return login.unauthorized()
+
+    _flush(force=True)
+    return Response(prometheus(collect()), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,92 @@
+"""
+Versioned changes to the database schema.
+
+Each module in this package named `v<number>_<description>.py`
+defines `upgrade(connection)`, and is applied once, in order of
+its number, by `flask db-upgrade`. The version of the database is
+recorded in the `schema_version` table.
+
+SQLite does not reliably run DDL inside a transaction, so
+migrations should be safe to re-run if interrupted.
+"""
+
+from __future__ import annotations
+
+import importlib
+import pkgutil
+import time
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Optional
+
+import click
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .. import app, cache, db
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name:    str
+    module:  ModuleType
+
+    def upgrade(self, connection: Connection) -> None:
+        self.module.upgrade(connection)
+
+
+def migrations() -> list[Migration]:
+    """All the available migrations, in order"""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith('v'):
+            continue
+        number, _, name = info.name[1:].partition('_')
+        module = importlib.import_module(f'{__name__}.{info.name}')
+        found.append(Migration(version=int(number), name=name, module=module))
+    return sorted(found, key=lambda m: m.version)
+
+
+def current_version(connection: Connection) -> int:
+    """The version of the database schema, 0 if no migrations have been applied"""
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER NOT NULL PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "applied_at INTEGER NOT NULL)"
+    ))
+    return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def upgrade(target: Optional[int] = None) -> list[Migration]:
+    """Apply each migration newer than the current version, up to `target`"""
+    applied = []
+    with db.engine.begin() as connection:
+        version = current_version(connection)
+
+    for m in migrations():
+        if m.version <= version or (target is not None and m.version > target):
+            continue
+        with db.engine.begin() as connection:
+            m.upgrade(connection)
+            connection.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                dict(v=m.version, n=m.name, t=int(time.time())),
+            )
+            # Migrations may rewrite data, which cached pages were rendered from
+            dv = cache.bump(connection)
+        if dv is not None:
+            cache.version_file().publish(dv)
+        applied.append(m)
+    return applied
+
+
+@app.cli.command('db-upgrade')
+@click.option('--to', 'target', type=int, default=None, help='Stop at this version')
+def upgrade_command(target: Optional[int]):
+    """Bring the database schema up to date"""
+    for m in upgrade(target):
+        click.echo(f'Applied migration {m.version}: {m.name}')
+    with db.engine.begin() as connection:
+        click.echo(f'Database is at version {current_version(connection)}')
@@ -0,0 +1,125 @@
+"""
+The schema as it was before versioned migrations, when the tables
+were created by `db.create_all()`. Existing tables are left as they are.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+TABLES = {
+    'teams': """
+        CREATE TABLE teams (
+            id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            year INTEGER NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+    'players': """
+        CREATE TABLE players (
+            id INTEGER NOT NULL,
+            team_id INTEGER NOT NULL,
+            name_first VARCHAR NOT NULL,
+            name_last VARCHAR NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(team_id) REFERENCES teams (id)
+        )""",
+    'matches': """
+        CREATE TABLE matches (
+            id INTEGER NOT NULL,
+            team1_id INTEGER NOT NULL,
+            team2_id INTEGER NOT NULL,
+            score1 FLOAT,
+            score2 FLOAT,
+            score1_in1 FLOAT,
+            score2_in1 FLOAT,
+            play_date INTEGER,
+            PRIMARY KEY (id),
+            FOREIGN KEY(team1_id) REFERENCES teams (id),
+            FOREIGN KEY(team2_id) REFERENCES teams (id)
+        )""",
+    'blogs': """
+        CREATE TABLE blogs (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            text VARCHAR,
+            date INTEGER NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+    'attachments': """
+        CREATE TABLE attachments (
+            id INTEGER NOT NULL,
+            blog_id INTEGER,
+            name VARCHAR NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(blog_id) REFERENCES blogs (id)
+        )""",
+    'standings': """
+        CREATE TABLE standings (
+            team_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            played INTEGER NOT NULL,
+            wins INTEGER NOT NULL,
+            draws INTEGER NOT NULL,
+            losses INTEGER NOT NULL,
+            points INTEGER NOT NULL,
+            scored FLOAT NOT NULL,
+            conceded FLOAT NOT NULL,
+            PRIMARY KEY (team_id),
+            FOREIGN KEY(team_id) REFERENCES teams (id) ON DELETE CASCADE
+        )""",
+    'seasons': """
+        CREATE TABLE seasons (
+            year INTEGER NOT NULL,
+            champion_id INTEGER,
+            champion_name VARCHAR,
+            points INTEGER NOT NULL,
+            rounders FLOAT NOT NULL,
+            total_matches INTEGER NOT NULL,
+            total_rounders FLOAT NOT NULL,
+            PRIMARY KEY (year),
+            FOREIGN KEY(champion_id) REFERENCES teams (id) ON DELETE SET NULL
+        )""",
+}
+
+
+# As `standings.rebuild()` did at this version, where a missing score counts as -1
+REBUILD_STANDINGS = """
+    INSERT INTO standings (team_id, year, played, wins, draws, losses, points, scored, conceded)
+    SELECT id, year, played, wins, draws, losses, 2 * wins + draws, scored, conceded
+    FROM (
+        SELECT
+            teams.id AS id,
+            teams.year AS year,
+            count(CASE WHEN sides.home IS NOT NULL OR sides.away IS NOT NULL THEN 1 END) AS played,
+            count(CASE WHEN coalesce(sides.home, -1) > coalesce(sides.away, -1) THEN 1 END) AS wins,
+            count(CASE WHEN (sides.home IS NOT NULL OR sides.away IS NOT NULL)
+                        AND coalesce(sides.home, -1) = coalesce(sides.away, -1) THEN 1 END) AS draws,
+            count(CASE WHEN coalesce(sides.home, -1) < coalesce(sides.away, -1) THEN 1 END) AS losses,
+            coalesce(sum(CASE WHEN sides.home IS NOT NULL OR sides.away IS NOT NULL
+                              THEN coalesce(sides.home, 0) ELSE 0 END), 0) AS scored,
+            coalesce(sum(CASE WHEN sides.home IS NOT NULL OR sides.away IS NOT NULL
+                              THEN coalesce(sides.away, 0) ELSE 0 END), 0) AS conceded
+        FROM teams
+        LEFT OUTER JOIN (
+            SELECT team1_id AS team_id, score1 AS home, score2 AS away FROM matches
+            UNION ALL
+            SELECT team2_id, score2, score1 FROM matches
+        ) AS sides ON sides.team_id = teams.id
+        GROUP BY teams.id
+    )"""
+
+
+def upgrade(connection: Connection) -> None:
+    existing = set(connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table'")
+    ).scalars())
+
+    for name, ddl in TABLES.items():
+        if name not in existing:
+            connection.execute(text(ddl))
+
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_standings_year ON standings (year)"))
+
+    # Fill in the standings of any existing matches
+    if 'standings' not in existing:
+        connection.execute(text(REBUILD_STANDINGS))
@@ -0,0 +1,22 @@
+"""
+Indexes for the columns that routes filter and order by.
+`ix_teams_year` also covers the list of distinct years.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+INDEXES = {
+    'ix_matches_team1_id':     'matches (team1_id)',
+    'ix_matches_team2_id':     'matches (team2_id)',
+    'ix_teams_year':           'teams (year)',
+    'ix_players_team_id':      'players (team_id)',
+    'ix_attachments_blog_id':  'attachments (blog_id)',
+    'ix_blogs_date':           'blogs (date)',
+}
+
+
+def upgrade(connection: Connection) -> None:
+    for name, on in INDEXES.items():
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {on}"))
+    connection.execute(text("ANALYZE"))
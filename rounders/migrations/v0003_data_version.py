@@ -0,0 +1,20 @@
+"""
+A single row counting the transactions which have changed the database,
+used to validate cached pages and ETags across all workers.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS data_version ("
+        "id INTEGER NOT NULL PRIMARY KEY CHECK (id = 1), "
+        "version INTEGER NOT NULL, "
+        "updated_at INTEGER NOT NULL)"
+    ))
+    connection.execute(text(
+        "INSERT OR IGNORE INTO data_version (id, version, updated_at) "
+        "VALUES (1, 0, CAST(strftime('%s', 'now') AS INTEGER))"
+    ))
@@ -0,0 +1,16 @@
+"""
+Record whether the thumbnail of each attachment has been generated,
+so that pages never have to check the disk or generate one.
+Existing attachments start as pending, until `flask backfill-thumbs` is run.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    columns = [row[1] for row in connection.execute(text("PRAGMA table_info(attachments)"))]
+    if 'thumb_state' not in columns:
+        connection.execute(text(
+            "ALTER TABLE attachments ADD COLUMN thumb_state VARCHAR NOT NULL DEFAULT 'pending'"
+        ))
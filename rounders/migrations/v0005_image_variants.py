@@ -0,0 +1,16 @@
+"""
+Record the dimensions of each photo, for the `srcset` of its variants.
+Every attachment goes back to pending, as the variants replace the
+single thumbnail, until `flask backfill-thumbs` is run.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    columns = [row[1] for row in connection.execute(text("PRAGMA table_info(attachments)"))]
+    for column in ('width', 'height'):
+        if column not in columns:
+            connection.execute(text(f"ALTER TABLE attachments ADD COLUMN {column} INTEGER"))
+    connection.execute(text("UPDATE attachments SET thumb_state = 'pending' WHERE width IS NULL"))
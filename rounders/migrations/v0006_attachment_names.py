@@ -0,0 +1,12 @@
+"""
+Index attachments by the name of their file, which is shared by
+attachments of the same photo since uploads are stored by their hash,
+and is counted before the file is deleted.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_attachments_name ON attachments (name)"))
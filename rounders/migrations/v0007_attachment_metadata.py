@@ -0,0 +1,36 @@
+"""
+Record the URL, size and type of the file of each attachment, checked once
+when it is stored, so that rendering a page never touches the disk.
+Existing attachments are checked here, and `flask check-attachments`
+re-checks every file.
+"""
+
+import mimetypes
+from pathlib import Path
+
+from flask import current_app as app
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    columns = [row[1] for row in connection.execute(text("PRAGMA table_info(attachments)"))]
+    for column, type in (('path', 'VARCHAR'), ('size', 'INTEGER'), ('content_type', 'VARCHAR')):
+        if column not in columns:
+            connection.execute(text(f"ALTER TABLE attachments ADD COLUMN {column} {type}"))
+
+    # Only the configured folders, from the app running the migration
+    folder = Path(app.config['ATTACHMENTS_FOLDER'])
+    for id, name in connection.execute(text("SELECT id, name FROM attachments WHERE path IS NULL")).all():
+        p = Path(folder, name)
+        if not p.resolve().is_relative_to(folder):
+            continue
+        connection.execute(
+            text("UPDATE attachments SET path = :path, size = :size, content_type = :type WHERE id = :id"),
+            dict(
+                id=id,
+                path=p.relative_to(app.static_folder).as_posix(),
+                size=p.stat().st_size if p.exists() else None,
+                type=mimetypes.guess_type(name)[0],
+            ),
+        )
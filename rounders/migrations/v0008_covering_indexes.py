@@ -0,0 +1,22 @@
+"""
+Covering indexes for the lookups of a team's matches and players, which
+read the scores, dates and names from the index without visiting the
+table. SQLite puts the rowid at the end of every index, so `ix_teams_year`
+and `ix_blogs_date` already cover `teams (year, id)` and the keyset
+cursor on `blogs (date, id)`.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+INDEXES = {
+    'ix_matches_team1_results': 'matches (team1_id, play_date, score1, score2)',
+    'ix_matches_team2_results': 'matches (team2_id, play_date, score2, score1)',
+    'ix_players_team_names':    'players (team_id, name_last, name_first)',
+}
+
+
+def upgrade(connection: Connection) -> None:
+    for name, on in INDEXES.items():
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {on}"))
+    connection.execute(text("ANALYZE"))
@@ -0,0 +1,12 @@
+"""
+Start the data version at 1 rather than 0, which the shared version file
+uses to mean that nothing has been published, so that the first request
+to a database which has never been written to does not fail.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text("UPDATE data_version SET version = 1 WHERE version = 0"))
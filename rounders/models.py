@@ -11,7 +11,7 @@ from typing import Optional
 from sqlalchemy import ForeignKey, or_
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from . import app, db
+from . import db
 
 
 @dataclass(frozen=True)
@@ -30,7 +30,7 @@ class Team(db.Model):
     # Columns
     id:   Mapped[int] = mapped_column(primary_key=True, nullable=False)
     name: Mapped[str] = mapped_column(nullable=False)
-    year: Mapped[int] = mapped_column(nullable=False)
+    year: Mapped[int] = mapped_column(nullable=False, index=True)
 
     # Relationships
     matches1: Mapped[list["Match"]] = relationship(foreign_keys="Match.team1_id", back_populates="team1", lazy="dynamic")
@@ -89,7 +89,7 @@ class Player(db.Model):
 
     # Columns
     id:         Mapped[int] = mapped_column(primary_key=True, nullable=False)
-    team_id:    Mapped[int] = mapped_column(ForeignKey('teams.id'), nullable=False)
+    team_id:    Mapped[int] = mapped_column(ForeignKey('teams.id'), nullable=False, index=True)
     name_first: Mapped[str] = mapped_column(nullable=False)
     name_last:  Mapped[str] = mapped_column(nullable=False)
 
@@ -106,10 +106,10 @@ class Match(db.Model):
 
     # Columns
     id:         Mapped[int]   = mapped_column(primary_key=True, nullable=False)
-    team1_id:   Mapped[int]   = mapped_column(ForeignKey('teams.id'), nullable=False)
-    team2_id:   Mapped[int]   = mapped_column(ForeignKey('teams.id'), nullable=False)
-    score1:     Mapped[Optional[float]] = mapped_column(nullable=True)
-    score2:     Mapped[Optional[float]] = mapped_column(nullable=True)
+    team1_id:   Mapped[int]   = mapped_column(ForeignKey('teams.id'), nullable=False, index=True, active_history=True)
+    team2_id:   Mapped[int]   = mapped_column(ForeignKey('teams.id'), nullable=False, index=True, active_history=True)
+    score1:     Mapped[Optional[float]] = mapped_column(nullable=True, active_history=True)
+    score2:     Mapped[Optional[float]] = mapped_column(nullable=True, active_history=True)
     score1_in1: Mapped[Optional[float]] = mapped_column(nullable=True)
     """Points scored by team 1 in the first inning, may be null even if score1 is not null"""
     score2_in1: Mapped[Optional[float]] = mapped_column(nullable=True)
@@ -184,6 +184,3 @@ class Match(db.Model):
                 else (inning1 or 0) + (inning2 or 0)
             )
 
-# Create all the tables based on these models
-with app.app_context():
-    db.create_all()
@@ -3,60 +3,50 @@ Defines the endpoints available (i.e. the valid paths that users can make reques
 and their responses.
 """
 
+import base64
 import re
 from datetime import UTC, datetime
 from pathlib import Path
 from typing import Sequence
 
-import pandas as pd
-from dateutil import parser
-from flask import flash, redirect, render_template, request, url_for
+from flask import abort, flash, redirect, render_template, request, url_for
 from flask_login import login_required
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import aliased
+from sqlalchemy import or_, tuple_
 
 import config
 
 from . import app, db
+from . import filestore, snapshot, thumbnails, zipstream
 from . import formatting as fmt
 from .blogs import Attachment, Entry
+from .cache import cached_response, conditional
+from .database import retry_on_locked
 from .models import Match, Player, Team
+from .table import Table
 
 
 @app.route('/')
+@conditional
+@cached_response
 def home():
 
-    years = sorted(db.session.execute(db.select(Team.year).distinct()).scalars().all())
-    years = [y for y in years if y <= config.LAST_COMPLETE_YEAR][::-1]
-
-    teams: list[Team] = db.session.scalars(
-        db.select(Team)
-    ).all()
-
-    matches: list[Match] = db.session.scalars(
-        db.select(Match)
-    ).all()
+    summaries = snapshot.current().seasons
 
-    teams = sorted(teams, key=lambda t: t.net_rounders, reverse=True)
-    teams = sorted(teams, key=lambda t: t.num_points, reverse=True)
-
-    def first_with_year(teams, year) -> Team | None:
-        for t in teams:
-            if t.year == year: return t
-        return None
-
-    winners = [first_with_year(teams, y) for y in years]
-    winners = [w for w in winners if w]
+    # Completed seasons, newest first
+    winners = [
+        s for s in summaries[::-1]
+        if s.year <= config.LAST_COMPLETE_YEAR and s.champion_id is not None
+    ]
 
-    num_matches = len([m for m in matches if m.played])
-    num_rounders = sum(t.num_rounders_scored for t in teams)
+    num_matches = sum(s.total_matches for s in summaries)
+    num_rounders = sum(s.total_rounders for s in summaries)
 
-    df = pd.DataFrame(dict(
-        id       = [t.id for t in winners],
-        year     = [t.year for t in winners],
-        name     = [fmt.AsTeamName(t) for t in winners],
-        points   = [t.num_points for t in winners],
-        rounders = [fmt.AsScore(t.num_rounders_scored / max(t.num_matches_played, 1)) for t in winners],
+    df = Table(dict(
+        id       = [s.champion_id for s in winners],
+        year     = [s.year for s in winners],
+        name     = [s.champion_name for s in winners],
+        points   = [s.points for s in winners],
+        rounders = [fmt.AsScore(s.rounders) for s in winners],
     ))
 
     return render_template(
@@ -69,42 +59,51 @@ def home():
 
 
 @app.route('/teams/')
+@conditional
+@cached_response
 def route_teams():
     """Get a list of all teams"""
 
+    data = snapshot.current()
+
     # Get a list of available years
-    years = sorted(db.session.execute(db.select(Team.year).distinct()).scalars().all())
+    years = list(data.years)
     if not years: years.append(datetime.now().year)
 
     # Use the year specified in the query parameters,
     # otherwise use the latest available year
     year: int = request.args.get('year', default=years[-1], type=int)
 
-    # Fetch the teams
-    teams: list[Team] = db.session.scalars(
-        db
-        .select(Team)
-        .where(Team.year == year)
-        .order_by(Team.id)
-    ).all()
-
-    # Create table of teams, total scores and play count, sorting by score
-    teams_df = pd.DataFrame(dict(
-        id          = [t.id for t in teams],
-        name        = [fmt.AsTeamName(t) for t in teams],
-        match_count = [ t.num_matches_played for t in teams ],
-        points      = [ t.num_points for t in teams ],
-        wins        = [ t.num_wins for t in teams ],
-        draws       = [ t.num_draws for t in teams ],
-        losses      = [ t.num_losses for t in teams ],
-        scored      = [ fmt.AsScore(t.num_rounders_scored / max(t.num_matches_played, 1)) for t in teams ],
-        conceded    = [ fmt.AsScore(t.num_rounders_conceded / max(t.num_matches_played, 1)) for t in teams ],
-        difference  = [ fmt.AsScore(t.net_rounders / max(t.num_matches_played, 1)) for t in teams ],
-    )).sort_values('difference', ascending=False).sort_values('points', ascending=False)
-
+    # The standings of each team
+    teams = data.standings.get(year, ())
+
+    # Create table of teams, total scores and play count, sorting by score.
+    # Formatted columns are sorted by their `_key` column.
+    scored     = [ t.scored / max(t.played, 1) for t in teams ]
+    conceded   = [ t.conceded / max(t.played, 1) for t in teams ]
+    difference = [ t.net / max(t.played, 1) for t in teams ]
+    teams_df = Table(dict(
+        id             = [t.id for t in teams],
+        name           = fmt.team_names(t.name for t in teams),
+        name_key       = ["" if t.name is None else t.name for t in teams],
+        match_count    = [ t.played for t in teams ],
+        points         = [ t.points for t in teams ],
+        wins           = [ t.wins for t in teams ],
+        draws          = [ t.draws for t in teams ],
+        losses         = [ t.losses for t in teams ],
+        scored         = fmt.score_names(scored),
+        scored_key     = fmt.sort_keys(scored),
+        conceded       = fmt.score_names(conceded),
+        conceded_key   = fmt.sort_keys(conceded),
+        difference     = fmt.score_names(difference),
+        difference_key = fmt.sort_keys(difference),
+    )).sort_values(['points', 'difference_key', 'name_key'], ascending=[False, False, True])
+
+    # Teams tied on the chosen column stay in the order of the standings
     sortby = request.args.get('sortby')
     if sortby in teams_df:
-        teams_df = teams_df.sort_values(sortby, ascending=sortby=='name')
+        key = f'{sortby}_key' if f'{sortby}_key' in teams_df else sortby
+        teams_df = teams_df.sort_values(key, ascending=sortby=='name')
 
     # Render only the table if the request is from htmx
     template = 'teams/table.html' if request.headers.get('hx-request') else 'teams/index.html'
@@ -121,6 +120,7 @@ def route_teams():
 
 @app.route('/teams/', methods=["POST"])
 @login_required
+@retry_on_locked
 def route_teams_post():
     """Create a team"""
 
@@ -143,7 +143,7 @@ def route_teams_post():
 
     team = Team(name=name, year=year) # type: ignore
     db.session.add(team)
-    db.session.commit()
+    db.session.flush()
 
     team_id = team.id
     if not team_id:
@@ -196,31 +196,40 @@ def route_teams_postform():
 
 
 @app.route('/teams/<int:id>/')
+@conditional
+@cached_response
 def route_team(id: int):
     """Get a single team"""
 
-    team = db.get_or_404(Team, int(id))
-
-    matches: list[Match] = db.session.scalars(
-        db.select(Match).where(or_(Match.team1_id == team.id, Match.team2_id == team.id))
-    ).all() # type: ignore
-
-    matches_df = pd.DataFrame(dict(
-        date    = [fmt.AsDate(m.play_date) for m in matches],
-        time    = [fmt.AsTime(m.play_date) for m in matches],
-        id      = [m.id for m in matches],
-        name1   = [fmt.AsTeamName(team)] * len(matches),
-        name2   = [fmt.AsTeamName(m.opponent_of(team)) for m in matches],
-        teamid1 = [team.id] * len(matches),
-        teamid2 = [m.opponent_of(team).id for m in matches],
-        score1  = [fmt.AsScore(m.pov_score(team).home) for m in matches],
-        score2  = [fmt.AsScore(m.pov_score(team).away) for m in matches],
-        played  = [m.played for m in matches],
-    )).sort_values('date')
-
-    players_df = pd.DataFrame(dict(
-        name_first = [p.name_first for p in team.players],
-        name_last  = [p.name_last for p in team.players],
+    data = snapshot.current()
+    team = data.teams.get(id)
+    if team is None:
+        abort(404)
+    matches = data.team_matches.get(id, ())
+
+    play_date = [m.play_date for m in matches]
+    score1    = [m.pov_score(team).home for m in matches]
+    score2    = [m.pov_score(team).away for m in matches]
+    matches_df = Table(dict(
+        date       = fmt.date_names(play_date),
+        time       = fmt.time_names(play_date),
+        date_key   = fmt.sort_keys(play_date),
+        id         = [m.id for m in matches],
+        name1      = fmt.team_names([team.name] * len(matches)),
+        name2      = fmt.team_names([m.opponent_of(team).name for m in matches]),
+        teamid1    = [team.id] * len(matches),
+        teamid2    = [m.opponent_of(team).id for m in matches],
+        score1     = fmt.score_names(score1),
+        score1_key = fmt.sort_keys(score1),
+        score2     = fmt.score_names(score2),
+        score2_key = fmt.sort_keys(score2),
+        played     = [m.played for m in matches],
+    )).sort_values(['date_key', 'id'], ascending=[False, True])
+
+    players = data.players.get(id, ())
+    players_df = Table(dict(
+        name_first = [p.name_first for p in players],
+        name_last  = [p.name_last for p in players],
     ))
 
     return render_template(
@@ -234,6 +243,7 @@ def route_team(id: int):
 
 @app.route('/teams/<int:id>/edit/', methods=["POST"])
 @login_required
+@retry_on_locked
 def route_team_patch(id):
     """Edit a team"""
 
@@ -275,10 +285,11 @@ def route_team_patchform(id):
     team = db.get_or_404(Team, int(id))
 
     # Create table of teams for the form options
-    players_df = pd.DataFrame(dict(
-        id         = [p.id for p in team.players],
-        name_first = [p.name_first for p in team.players],
-        name_last = [p.name_last for p in team.players],
+    players = team.players.all() # type: ignore
+    players_df = Table(dict(
+        id         = [p.id for p in players],
+        name_first = [p.name_first for p in players],
+        name_last = [p.name_last for p in players],
     )).sort_values('name_last')
  
     return render_template(
@@ -293,6 +304,7 @@ def route_team_patchform(id):
 
 @app.route('/teams/<int:id>/delete/', methods=["POST"])
 @login_required
+@retry_on_locked
 def route_team_delete(id):
     """Delete a team"""
 
@@ -329,60 +341,84 @@ def route_team_delete(id):
     return redirect(redirect_url)
 
 
+GROUPINGS = dict(
+    week   = ('week_key', 'week_key', True),
+    date   = ('date', 'date_key', True),
+    name1  = ('teamid1', 'name1', False),
+    name2  = ('teamid2', 'name2', False),
+    winner = ('winner_id', 'winner_key', False),
+)
+"""
+Ways to group the list of matches, as the column to group by,
+the column to order the groups by, and whether the groups of results
+should be newest first. Each group is labelled by the column of that name.
+"""
+
 @app.route('/matches/')
+@conditional
+@cached_response
 def route_matches():
     """Get all matches"""
 
+    data = snapshot.current()
+
     # Get a list of available years
-    years = sorted(db.session.execute(db.select(Team.year).distinct()).scalars().all())
+    years = list(data.years)
     if not years: years.append(datetime.now().year)
 
     # Use the year specified in the query parameters,
     # otherwise use the latest available year
     year: int = request.args.get('year', default=years[-1], type=int)
 
-    # Fetch the matches
-    # Decide which belong to this year by the teams in them,
+    # The matches of this year, decided by the teams in them,
     # rather than the date of the match.
-    team1 = aliased(Team)
-    team2 = aliased(Team)
-    matches = db.session.execute(
-        db
-        .select(Match, team1, team2)
-        .join(team1, team1.id == Match.team1_id)
-        .join(team2, team2.id == Match.team2_id)
-        .filter(and_(team1.year == year, team2.year == year))
-    ).fetchall()
-
-
-    # Create dataframe, sort by newest first
-    matches_df = pd.DataFrame(dict(
-        week    = [fmt.AsWeekOf(m[0].play_date, newest_first=m[0].played) for m in matches],
-        date    = [fmt.AsDate(m[0].play_date, newest_first=m[0].played) for m in matches],
-        time    = [fmt.AsTime(m[0].play_date, newest_first=m[0].played) for m in matches],
-        id      = [m[0].id for m in matches],
-        name1   = [fmt.AsTeamName(m[1]) for m in matches],
-        name2   = [fmt.AsTeamName(m[2]) for m in matches],
-        teamid1 = [m[1].id for m in matches],
-        teamid2 = [m[2].id for m in matches],
-        score1  = [fmt.AsScore(m[0].score1) for m in matches],
-        score2  = [fmt.AsScore(m[0].score2) for m in matches],
-        winner  = [fmt.AsTeamName(m[0].winner) for m in matches],
-        played  = [m[0].played for m in matches],
-    )).sort_values('date')
+    matches = data.year_matches.get(year, ())
+
+    # Create dataframe, formatted columns are sorted and grouped by their `_key` column
+    play_date = [m.play_date for m in matches]
+    score1    = [m.score1 for m in matches]
+    score2    = [m.score2 for m in matches]
+    winners   = [m.winner for m in matches]
+    matches_df = Table(dict(
+        week       = fmt.week_names(play_date),
+        week_key   = fmt.sort_keys(fmt.week_starts(play_date)),
+        date       = fmt.date_names(play_date),
+        time       = fmt.time_names(play_date),
+        date_key   = fmt.sort_keys(play_date),
+        id         = [m.id for m in matches],
+        name1      = fmt.team_names([m.team1.name for m in matches]),
+        name2      = fmt.team_names([m.team2.name for m in matches]),
+        teamid1    = [m.team1.id for m in matches],
+        teamid2    = [m.team2.id for m in matches],
+        score1     = fmt.score_names(score1),
+        score1_key = fmt.sort_keys(score1),
+        score2     = fmt.score_names(score2),
+        score2_key = fmt.sort_keys(score2),
+        winner     = fmt.team_names([w and w.name for w in winners]),
+        winner_key = [w.name if w else "" for w in winners],
+        winner_id  = [w.id if w else -1 for w in winners],
+        played     = [m.played for m in matches],
+    ))
 
     groupby = request.args.get('groupby')
-    if groupby not in matches_df:
+    if groupby not in GROUPINGS:
         groupby = 'week'
+    by, order_by, by_date = GROUPINGS[groupby]
+
+    # Scheduled matches soonest first, and results newest first
+    # Matches at the same time in the order they were added
+    scheduled = matches_df.where(lambda m: not m['played']).sort_values(['date_key', 'id'])
+    results = matches_df.where(lambda m: m['played']).sort_values(['date_key', 'id'], ascending=[False, True])
 
     # Render only the list if the request is from htmx
     template = 'matches/list_grouped.html' if request.headers.get('hx-request') else 'matches/index.html'
 
     return render_template(
         template,
-        title   = 'Matches',
-        matches = matches_df,
-        groupby = groupby,
+        title     = 'Matches',
+        matches   = matches_df,
+        scheduled = fmt.grouped(scheduled, by, order_by, groupby),
+        results   = fmt.grouped(results, by, order_by, groupby, descending=by_date),
         years   = years,
         year    = year,
     )
@@ -390,6 +426,7 @@ def route_matches():
 
 @app.route('/matches/', methods=["POST"])
 @login_required
+@retry_on_locked
 def route_matches_post():
     """Create a match"""
 
@@ -413,6 +450,8 @@ def route_matches_post():
 
     date_str = request.form.get("date")
     time_str = request.form.get("time") or "00:00"
+    # Imported here, as only needed when writing a match
+    from dateutil import parser
     date = int(parser.parse(f'{date_str}T{time_str}:00Z').timestamp()) if date_str else None
 
     innings1 = (
@@ -468,7 +507,7 @@ def route_matches_postform():
     ).all()
 
     # Create table of teams for the form options
-    teams_df: pd.DataFrame = pd.DataFrame(dict(
+    teams_df = Table(dict(
         id          = [t.id for t in teams],
         name        = [fmt.AsTeamName(t) for t in teams],
     )).sort_values('name')
@@ -484,6 +523,7 @@ def route_matches_postform():
 
 @app.route('/matches/<int:id>/edit', methods=["POST"])
 @login_required
+@retry_on_locked
 def route_match_patch(id):
     """Edit a match"""
 
@@ -493,6 +533,8 @@ def route_match_patch(id):
 
     date_str = request.form.get("date")
     time_str = request.form.get("time") or "00:00"
+    # Imported here, as only needed when writing a match
+    from dateutil import parser
     date = int(parser.parse(f'{date_str}T{time_str}:00Z').timestamp()) if date_str else None
 
     innings1 = (
@@ -543,6 +585,7 @@ def route_match_patchform(id):
 
 @app.route('/matches/<int:id>/delete/', methods=["POST"])
 @login_required
+@retry_on_locked
 def route_match_delete(id):
     """Delete a match"""
 
@@ -566,55 +609,112 @@ def route_match_delete(id):
 
 
 @app.route('/rules')
+@conditional
 def route_rules():
     return render_template('rules/index.html', title="Rules")
 
 
 @app.route('/photos')
+@conditional
+@cached_response
 def route_photos():
-
-    # Fetch the blogs
-    pages = db.paginate(
-        db
-        .select(Entry)
-        .order_by(Entry.date.desc()),
-        per_page=request.args.get('per_page', type=int, default=5)
-    )
-    blogs: Sequence[Entry] = pages.items
-
-    df = pd.DataFrame(dict(
+    """
+    Posts newest first, a page at a time. Pages follow on from the `cursor`
+    of the previous one, so that htmx can load them as the list is scrolled.
+    Numbered pages are still served for links with `page`.
+    """
+    per_page = request.args.get('per_page', type=int, default=5)
+    # As `db.paginate()` does for numbered pages
+    if per_page < 1:
+        abort(404)
+    query = db.select(Entry).order_by(Entry.date.desc(), Entry.id.desc())
+
+    pagination = None
+    cursor = None
+    if 'page' in request.args:
+        pages = db.paginate(query, per_page=per_page)
+        blogs: Sequence[Entry] = pages.items
+
+        # Only the arguments which select the page, as the page is cached
+        # for every request with the same `CACHE_ARGS` whatever else they have
+        args = {k: v for k, v in request.args.items() if k == 'per_page'}
+        args_next = args  | {'page': str(pages.next_num)}
+        args_prev = args  | {'page': str(pages.prev_num)}
+        args_first = args | {'page': 1}
+        args_last = args  | {'page': pages.pages}
+
+        assert request.endpoint != None
+        pagination = dict(
+            page=pages.page,
+            prev=url_for(request.endpoint, **args_prev) if pages.has_prev else "",
+            next=url_for(request.endpoint, **args_next) if pages.has_next else "",
+            first=url_for(request.endpoint, **args_first) if pages.pages > 1 and pages.page != 1 else "",
+            last=url_for(request.endpoint, **args_last) if pages.pages > 1 and pages.page != pages.pages else "",
+        )
+    else:
+        # Seek past the last post of the previous page, which costs the same
+        # however far down the page is, and one more to know if there are more
+        if 'cursor' in request.args:
+            after = _decode_cursor(request.args['cursor'])
+            query = query.where(tuple_(Entry.date, Entry.id) < after)
+        blogs = db.session.scalars(query.limit(per_page + 1)).all()
+        if len(blogs) > per_page:
+            blogs = blogs[:per_page]
+            if blogs:
+                cursor = _encode_cursor(blogs[-1])
+
+    # The attachments of every post on the page, in one query
+    attachments: dict[int, list[Attachment]] = {b.id: [] for b in blogs}
+    for a in db.session.scalars(
+        db.select(Attachment).where(Attachment.blog_id.in_(attachments)).order_by(Attachment.id)
+    ):
+        attachments[a.blog_id].append(a)
+
+    df = Table(dict(
         id    = [b.id for b in blogs],
         title = [b.title for b in blogs],
         text  = [b.text for b in blogs],
         date  = [fmt.AsDate(b.date, with_year=True) for b in blogs],
-        attachments = [b.attachments for b in blogs],
+        attachments = [attachments[b.id] for b in blogs],
     ))
 
-    # Render only the table if the request is from htmx
-    template = 'photos/list.html' if request.headers.get('hx-request') else 'photos/index.html'
-
-    args_next = request.args  | {'page': str(pages.next_num)}
-    args_prev = request.args  | {'page': str(pages.prev_num)}
-    args_first = request.args | {'page': 1}
-    args_last = request.args  | {'page': pages.pages}
+    # Render only the posts if the request is from htmx,
+    # and only the next posts when scrolling down the list
+    if not request.headers.get('hx-request'):
+        template = 'photos/index.html'
+    elif 'cursor' in request.args:
+        template = 'photos/items.html'
+    else:
+        template = 'photos/list.html'
 
-    assert request.endpoint != None
+    args_more = {k: v for k, v in request.args.items() if k == 'per_page'} | {'cursor': cursor}
     return render_template(
         template,
         title="Photos",
         blogs=df,
-        pagination=dict(
-            page=pages.page,
-            prev=url_for(request.endpoint, **args_prev) if pages.has_prev else "",
-            next=url_for(request.endpoint, **args_next) if pages.has_next else "",
-            first=url_for(request.endpoint, **args_first) if pages.pages > 1 and pages.page != 1 else "",
-            last=url_for(request.endpoint, **args_last) if pages.pages > 1 and pages.page != pages.pages else "",
-        ),
+        thumb_size=config.THUMB_SIZE,
+        pagination=pagination,
+        more=url_for('route_photos', **args_more) if cursor else "",
     )
 
 
+def _encode_cursor(entry: Entry) -> str:
+    """Opaque position of a post in the list of posts, for `route_photos()`"""
+    return base64.urlsafe_b64encode(f'{entry.date}.{entry.id}'.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int]:
+    """The date and id of the post at `cursor`"""
+    try:
+        date, id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('.')
+        return int(date), int(id)
+    except (ValueError, UnicodeDecodeError):
+        abort(400)
+
+
 @app.route('/photos', methods=['POST'])
 @login_required
+@retry_on_locked
 def route_photos_post():
     redirect_url = '/photos'
 
@@ -628,60 +728,106 @@ def route_photos_post():
     files = request.files.getlist('attachments')
     timestamp = int(datetime.now(UTC).timestamp())
     exts = [a.filename.rsplit('.', 1)[1] for a in files]
-    outputs = [f'{timestamp}_{i}.{ext}' for i, ext in enumerate(exts)]
     allowed_exts = ['png', 'jpg', 'jpeg']
     if not all(ext in allowed_exts for ext in exts):
         flash("Files must have an extension from " + ', '.join(allowed_exts))
         return redirect(redirect_url)
 
-    # Create the blog in the database
-    entry = Entry(
-        title = fmt.basic_sanitisation(title),
-        text  = fmt.basic_sanitisation(text) if text else None,
-        date  = timestamp,
-    )
-    db.session.add(entry)
-    db.session.commit()
+    # Save the attachments to disk before adding them to the database,
+    # so that a failed upload leaves no attachments without a file.
+    # Locked until committed, so that a shared file can't be deleted meanwhile.
+    folder = app.config['ATTACHMENTS_FOLDER']
+    with filestore.lock(folder):
+        stored = []
+        try:
+            for file, ext in zip(files, exts):
+                stored.append(filestore.store(file.stream, folder, ext))
+        except OSError as e:
+            app.logger.warning(f'Could not store attachment: {e}')
+            _discard(stored)
+            flash("Something went wrong")
+            return redirect(redirect_url)
+
+        # Create the blog and its attachments in the database
+        entry = Entry(
+            title = fmt.basic_sanitisation(title),
+            text  = fmt.basic_sanitisation(text) if text else None,
+            date  = timestamp,
+        )
+        try:
+            db.session.add(entry)
+            db.session.flush()
+            attachments = []
+            for s in stored:
+                a = Attachment(blog_id=entry.id, name=s.name)
+                a.record_file(s.size)
+                attachments.append(a)
+            db.session.add_all(attachments)
+
+            # Photos which were uploaded before may already have their variants,
+            # and those uploaded twice at once only need them generated once
+            queued = {
+                a.name: a for a, s in reversed(list(zip(attachments, stored)))
+                if s.new or not thumbnails.reuse(a)
+            }
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            _discard(stored)
+            raise
+
+    for a in queued.values():
+        thumbnails.queue(a)
 
-    if not entry.id:
-        flash("Something went wrong")
-        return redirect(redirect_url)
+    return redirect(redirect_url)
 
-    # Create the attachments in the database
-    attachments = [
-        Attachment(blog_id=entry.id, name=output)
-        for output in outputs
-    ]
 
-    for a in attachments:
-        db.session.add(a)
-    db.session.commit()
+def _discard(stored: list[filestore.Stored]) -> None:
+    """Delete the files of a failed upload, which were not already stored for other attachments"""
+    for s in stored:
+        if s.new:
+            Path(app.config['ATTACHMENTS_FOLDER'], s.name).unlink(missing_ok=True)
 
-    if not all(a.id for a in attachments):
-        flash("Something went wrong")
-        return redirect(redirect_url)
 
-    # Save the attachments to disk
-    for file, a in zip(files, attachments):
-        file.save(Path(app.config['ATTACHMENTS_FOLDER'], a.name))
+@app.route('/photos/<int:id>/download.zip')
+@conditional
+def route_photo_download(id):
+    """Download all the photos of a blog entry, as a ZIP archive streamed as it is built"""
 
-    return redirect(redirect_url)
+    entry = db.get_or_404(Entry, int(id))
+    attachments = db.session.scalars(
+        db.select(Attachment).where(Attachment.blog_id == entry.id).order_by(Attachment.id)
+    ).all()
+
+    slug = re.sub('[^A-Za-z0-9]+', '-', entry.title).strip('-').lower() or f'photos-{entry.id}'
+    files = [
+        (f'{slug}-{i}{a._filepath.suffix}', a._filepath)
+        for i, a in enumerate(attachments, start=1) if a._filepath is not None
+    ]
+
+    response = app.response_class(zipstream.stream_zip(files, date=entry.date), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{slug}.zip"'
+    return response
 
 
 @app.route('/photos/<int:id>/delete/', methods=["POST"])
 @login_required
+@retry_on_locked
 def route_photo_delete(id):
     """Delete a blog entry"""
 
     entry = db.get_or_404(Entry, int(id))
     redirect_url = request.args.get("next", default='/photos', type=str)
 
-    for a in entry.attachments:
-        a.delete()
+    attachments = entry.attachments.all() # type: ignore
+    for a in attachments:
         db.session.delete(a)
-
     db.session.delete(entry)
     db.session.commit()
 
+    # Only once the rows are gone, so that files shared with other attachments are kept
+    for a in attachments:
+        a.delete()
+
     flash("Removed post")
     return redirect(redirect_url)
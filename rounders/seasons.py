@@ -0,0 +1,136 @@
+"""
+Summaries of each season, for the home page.
+
+Seasons up to `config.LAST_COMPLETE_YEAR` no longer change,
+so their summaries are stored in the `seasons` table rather than
+recomputed from every team and match on each request.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import click
+from sqlalchemy import ForeignKey, event, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+import config
+
+from . import app, db
+from .cache import bump
+from .models import Match, Team
+from .standings import Standing, num_matches_played, standings
+
+
+class Season(db.Model):
+    """The outcome of a single year of the tournament"""
+
+    __tablename__ = "seasons"
+
+    # Columns
+    year:           Mapped[int]           = mapped_column(primary_key=True, nullable=False)
+    champion_id:    Mapped[Optional[int]] = mapped_column(ForeignKey('teams.id', ondelete='SET NULL'), nullable=True)
+    """The team with the most points, using net rounders as a tie-break"""
+    champion_name:  Mapped[Optional[str]] = mapped_column(nullable=True)
+    points:         Mapped[int]           = mapped_column(nullable=False, default=0)
+    """Points of the champion"""
+    rounders:       Mapped[float]         = mapped_column(nullable=False, default=0)
+    """Average rounders scored per match by the champion"""
+    total_matches:  Mapped[int]           = mapped_column(nullable=False, default=0)
+    """Number of matches played this season"""
+    total_rounders: Mapped[float]         = mapped_column(nullable=False, default=0)
+    """Number of rounders scored by all teams this season"""
+
+
+def summarise(year: int, connection: Optional[Connection] = None) -> Season:
+    """Compute the summary of a season, returned as a transient `Season`"""
+    return summary(year, standings(year, connection), num_matches_played(year, connection))
+
+
+def summary(year: int, teams: Sequence[Standing], total_matches: int) -> Season:
+    """The summary of a season, from the standings of its teams and the number of matches played"""
+
+    # Order by points, then net rounders
+    ranked = sorted(teams, key=lambda t: t.net, reverse=True)
+    ranked = sorted(ranked, key=lambda t: t.points, reverse=True)
+    champion = ranked[0] if ranked else None
+
+    return Season(
+        year           = year,
+        champion_id    = champion.id if champion else None,
+        champion_name  = champion.name if champion else None,
+        points         = champion.points if champion else 0,
+        rounders       = champion.scored / max(champion.played, 1) if champion else 0,
+        total_matches  = total_matches,
+        total_rounders = sum(t.scored for t in teams),
+    )
+
+
+def seasons(years: list[int]) -> list[Season]:
+    """
+    The summary of each of `years`. Completed seasons are read from the
+    `seasons` table if they have been frozen, any others are computed.
+    """
+    stored = {
+        s.year: s for s in db.session.scalars(
+            db.select(Season).where(Season.year.in_(years))
+        )
+    }
+    return [
+        stored[y] if y in stored and y <= config.LAST_COMPLETE_YEAR else summarise(y)
+        for y in years
+    ]
+
+
+def _store(connection: Connection, summary: Season) -> None:
+    """Insert or replace the stored summary of a season"""
+    values = {c.key: getattr(summary, c.key) for c in inspect(Season).column_attrs}
+    connection.execute(db.delete(Season).where(Season.year == summary.year))
+    connection.execute(db.insert(Season).values(**values))
+    bump(connection)
+
+
+@app.cli.command('freeze-seasons')
+def freeze_seasons_command():
+    """Store the summary of each complete season, e.g. after changing `config.LAST_COMPLETE_YEAR`"""
+    years = db.session.scalars(
+        db.select(Team.year).distinct().where(Team.year <= config.LAST_COMPLETE_YEAR)
+    ).all()
+    connection = db.session.connection()
+    for year in sorted(years):
+        _store(connection, summarise(year, connection))
+        click.echo(f'Stored summary of {year}')
+    db.session.commit()
+
+
+@event.listens_for(db.session, "after_flush")
+def _refresh_seasons(session: Session, _):
+    """
+    Recompute the stored summary of any completed season whose
+    teams or matches were changed in this flush. Runs after
+    the standings themselves have been updated.
+    """
+    team_ids = set()
+    years = set()
+    for obj in (*session.new, *session.deleted, *session.dirty):
+        if isinstance(obj, Match):
+            team_ids.update((obj.team1_id, obj.team2_id))
+        elif isinstance(obj, Team):
+            years.add(obj.year)
+
+    connection = session.connection()
+    if team_ids:
+        years.update(connection.execute(
+            db.select(Team.year).distinct().where(Team.id.in_(team_ids))
+        ).scalars())
+
+    complete = [y for y in years if y is not None and y <= config.LAST_COMPLETE_YEAR]
+    if not complete:
+        return
+
+    frozen = connection.execute(
+        db.select(Season.year).where(Season.year.in_(complete))
+    ).scalars().all()
+    for year in frozen:
+        _store(connection, summarise(year, connection))
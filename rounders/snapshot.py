@@ -0,0 +1,241 @@
+"""
+An immutable snapshot of the tournament, from which the public pages are read.
+
+Every team, player and match fits easily in the memory of each worker, so
+rather than being queried through the ORM on each request, they are read
+in a single transaction into frozen records, with indexes of the players
+of each team, the matches of each team and year, and the standings and
+summary of each season. A snapshot is never modified: after a write a new
+one is built and swapped in by reference, so requests still reading the
+old one are unaffected.
+
+A snapshot is only used at the data version it was read at (see `cache.py`),
+so a worker never serves data older than the latest write. The worker which
+wrote rebuilds in the background as soon as it commits, and any other worker
+on its next request, which requests arriving meanwhile wait for rather than
+rebuilding again. Reading only takes a snapshot of the WAL, so rebuilding
+never holds up a writer.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import has_request_context
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+import config
+
+from . import app, db
+from .cache import data_version, version_file
+from .models import Match, Player, Score, Team
+from .seasons import Season, summary
+from .standings import Standing, standings
+
+
+@dataclass(frozen=True, slots=True)
+class TeamRecord:
+    """A team, as `Team` without its relationships"""
+    id:   int
+    name: str
+    year: int
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerRecord:
+    """A member of a team, as `Player`"""
+    id:         int
+    team_id:    int
+    name_first: str
+    name_last:  str
+
+
+@dataclass(frozen=True, slots=True)
+class MatchRecord:
+    """A match, linked to the records of its teams, with the same properties as `Match`"""
+    id:         int
+    team1:      TeamRecord
+    team2:      TeamRecord
+    score1:     Optional[float]
+    score2:     Optional[float]
+    score1_in1: Optional[float]
+    score2_in1: Optional[float]
+    play_date:  Optional[int]
+
+    @property
+    def played(self) -> bool:
+        """Whether the match has been played or not"""
+        return self.score1 is not None or self.score2 is not None
+
+    @property
+    def winner(self) -> Optional[TeamRecord]:
+        """The winning team, if has been played and not a draw"""
+        s1 = -1 if self.score1 is None else self.score1
+        s2 = -1 if self.score2 is None else self.score2
+        if s1 == s2: return None
+        return self.team1 if s1 > s2 else self.team2
+
+    def pov_score(self, team: TeamRecord) -> Score:
+        """The result, from the POV of the given team"""
+        if team.id == self.team1.id:
+            return Score(home=self.score1, away=self.score2)
+        elif team.id == self.team2.id:
+            return Score(home=self.score2, away=self.score1)
+        else:
+            raise Exception("Not a valid team to view match as")
+
+    def opponent_of(self, team: TeamRecord) -> TeamRecord:
+        """The opponent of the given team"""
+        if team.id == self.team1.id:
+            return self.team2
+        elif team.id == self.team2.id:
+            return self.team1
+        else:
+            raise Exception("Not a valid team to view match as")
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Everything the public pages show about the teams and matches,
+    as of one data version. Never modified once built.
+    """
+    version:      int
+    """The data version it was read at"""
+    years:        tuple[int, ...]
+    """Years which have teams, in order"""
+    teams:        dict[int, TeamRecord]
+    """Every team, by id"""
+    players:      dict[int, tuple[PlayerRecord, ...]]
+    """The players of each team, by team id"""
+    team_matches: dict[int, tuple[MatchRecord, ...]]
+    """The matches of each team, by team id"""
+    year_matches: dict[int, tuple[MatchRecord, ...]]
+    """The matches of each year, between two teams of that year"""
+    standings:    dict[int, tuple[Standing, ...]]
+    """The standings of the teams of each year, ordered by team id"""
+    seasons:      tuple[Season, ...]
+    """The summary of each of `years`, as `seasons.seasons()`"""
+
+
+def build() -> Snapshot:
+    """Read the whole tournament from the database"""
+    with db.engine.connect() as connection:
+        # One transaction, so that every query reads the same version
+        connection.exec_driver_sql('BEGIN')
+        version = connection.execute(text("SELECT version FROM data_version")).scalar_one()
+
+        teams = {
+            id: TeamRecord(id, name, year)
+            for id, name, year in connection.execute(db.select(Team.id, Team.name, Team.year).order_by(Team.id))
+        }
+
+        players = defaultdict(list)
+        for row in connection.execute(
+            db.select(Player.id, Player.team_id, Player.name_first, Player.name_last).order_by(Player.id)
+        ):
+            players[row.team_id].append(PlayerRecord(*row))
+
+        team_matches = defaultdict(list)
+        year_matches = defaultdict(list)
+        num_played = defaultdict(int)
+        for row in connection.execute(
+            db.select(
+                Match.id, Match.team1_id, Match.team2_id,
+                Match.score1, Match.score2, Match.score1_in1, Match.score2_in1,
+                Match.play_date,
+            ).order_by(Match.id)
+        ):
+            match = MatchRecord(
+                id         = row.id,
+                team1      = teams[row.team1_id],
+                team2      = teams[row.team2_id],
+                score1     = row.score1,
+                score2     = row.score2,
+                score1_in1 = row.score1_in1,
+                score2_in1 = row.score2_in1,
+                play_date  = row.play_date,
+            )
+            team_matches[row.team1_id].append(match)
+            team_matches[row.team2_id].append(match)
+            if match.team1.year == match.team2.year:
+                year_matches[match.team1.year].append(match)
+            # As `num_matches_played()`, a match belongs to the year of its first team
+            num_played[match.team1.year] += match.played
+
+        year_standings = defaultdict(list)
+        for s in standings(connection=connection):
+            year_standings[s.year].append(s)
+
+        # Completed seasons which have been frozen are read as stored
+        years = tuple(sorted({t.year for t in teams.values()}))
+        stored = {
+            row.year: Season(**row._mapping)
+            for row in connection.execute(
+                db.select(
+                    Season.year, Season.champion_id, Season.champion_name, Season.points,
+                    Season.rounders, Season.total_matches, Season.total_rounders,
+                ).where(Season.year <= config.LAST_COMPLETE_YEAR)
+            )
+        }
+        connection.rollback()
+
+    return Snapshot(
+        version      = version,
+        years        = years,
+        teams        = teams,
+        players      = {k: tuple(v) for k, v in players.items()},
+        team_matches = {k: tuple(v) for k, v in team_matches.items()},
+        year_matches = {k: tuple(v) for k, v in year_matches.items()},
+        standings    = {k: tuple(v) for k, v in year_standings.items()},
+        seasons      = tuple(
+            stored[y] if y in stored else summary(y, year_standings[y], num_played[y])
+            for y in years
+        ),
+    )
+
+
+_current: Snapshot | None = None
+_lock = threading.Lock()
+
+
+def refresh(version: Optional[int] = None) -> Snapshot:
+    """
+    The snapshot at `version`, by default the latest published,
+    rebuilt unless another thread has done so meanwhile
+    """
+    global _current
+    if version is None:
+        published = version_file().read()
+        version = published.version if published else 0
+    with _lock:
+        if _current is None or _current.version != version:
+            _current = build()
+        return _current
+
+
+def current() -> Snapshot:
+    """The snapshot at the data version of this request"""
+    snapshot = _current
+    if snapshot is None or snapshot.version != data_version().version:
+        snapshot = refresh(data_version().version)
+    return snapshot
+
+
+def _refresh_in_background() -> None:
+    with app.app_context():
+        try:
+            refresh()
+        except Exception:
+            app.logger.exception('Could not rebuild the snapshot')
+
+
+@event.listens_for(db.session, "after_commit")
+def _rebuild_after_write(session: Session):
+    """Rebuild once this worker has written, rather than on its next request. Runs after the new version is published."""
+    if has_request_context() and _current is not None:
+        threading.Thread(target=_refresh_in_background, daemon=True).start()
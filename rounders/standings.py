@@ -0,0 +1,289 @@
+"""
+League standings of each team.
+
+These are kept in the `standings` table, which is updated
+incrementally whenever a `Match` is inserted, edited or
+deleted, so that reading the standings is a single lookup.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+import click
+from sqlalchemy import ForeignKey, and_, case, event, func, inspect, or_, union_all
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from . import app, db
+from .cache import bump
+from .models import Match, Team
+
+
+class TeamStanding(db.Model):
+    """
+    The materialised record of a single team,
+    maintained by `_update_standings()`
+    """
+    __tablename__ = "standings"
+
+    # Columns
+    team_id:  Mapped[int]   = mapped_column(ForeignKey('teams.id', ondelete='CASCADE'), primary_key=True, nullable=False)
+    year:     Mapped[int]   = mapped_column(nullable=False, index=True)
+    played:   Mapped[int]   = mapped_column(nullable=False, default=0)
+    wins:     Mapped[int]   = mapped_column(nullable=False, default=0)
+    draws:    Mapped[int]   = mapped_column(nullable=False, default=0)
+    losses:   Mapped[int]   = mapped_column(nullable=False, default=0)
+    points:   Mapped[int]   = mapped_column(nullable=False, default=0)
+    scored:   Mapped[float] = mapped_column(nullable=False, default=0)
+    conceded: Mapped[float] = mapped_column(nullable=False, default=0)
+
+
+@dataclass(frozen=True)
+class Standing:
+    """
+    The record of a single team, equivalent to the
+    `num_*` properties of `Team` but fetched in bulk.
+    Has `id` and `name` so that it can be formatted
+    in place of a `Team`.
+    """
+    id:       int
+    name:     str
+    year:     int
+    played:   int
+    wins:     int
+    draws:    int
+    losses:   int
+    scored:   float
+    conceded: float
+
+    @property
+    def points(self) -> int:
+        return 2 * self.wins + self.draws
+
+    @property
+    def net(self) -> float:
+        return self.scored - self.conceded
+
+
+STAT_COLUMNS = ('played', 'wins', 'draws', 'losses', 'points', 'scored', 'conceded')
+"""Columns of `TeamStanding` which are accumulated from each match"""
+
+
+def standings(year: Optional[int] = None, connection: Optional[Connection] = None) -> list[Standing]:
+    """
+    The standings of every team in `year`, or in all years if not given,
+    ordered by team id. Read from the `standings` table.
+    """
+    query = (
+        db
+        .select(
+            Team.id,
+            Team.name,
+            Team.year,
+            *(
+                func.coalesce(getattr(TeamStanding, c), 0)
+                for c in STAT_COLUMNS if c != 'points'
+            ),
+        )
+        .outerjoin(TeamStanding, TeamStanding.team_id == Team.id)
+        .order_by(Team.id)
+    )
+    if year is not None:
+        query = query.where(Team.year == year)
+
+    return [Standing(*row) for row in (connection or db.session).execute(query)]
+
+
+def num_matches_played(year: Optional[int] = None, connection: Optional[Connection] = None) -> int:
+    """
+    The number of matches which have been played in `year`, or in all years if
+    not given. A match belongs to the year of its first team.
+    """
+    query = (
+        db
+        .select(func.count())
+        .select_from(Match)
+        .where(or_(Match.score1.is_not(None), Match.score2.is_not(None)))
+    )
+    if year is not None:
+        query = query.join(Team, Team.id == Match.team1_id).where(Team.year == year)
+    return (connection or db.session).execute(query).scalar() or 0
+
+
+# --------------------------------------------
+# Computing the standings from scratch
+
+def _sides():
+    """Every match twice, once from the point of view of each team"""
+    return union_all(
+        db.select(
+            Match.team1_id.label('team_id'),
+            Match.score1.label('home'),
+            Match.score2.label('away'),
+        ),
+        db.select(Match.team2_id, Match.score2, Match.score1),
+    ).subquery('sides')
+
+
+def _aggregate(year: Optional[int] = None):
+    """
+    Query for the standings of every team, aggregated from the
+    matches in a single GROUP BY, with columns as per `Standing`
+    """
+    sides = _sides()
+
+    # Same semantics as `Match.played` and `Match.winner`,
+    # where a missing score counts as -1
+    played = or_(sides.c.home.is_not(None), sides.c.away.is_not(None))
+    home = func.coalesce(sides.c.home, -1)
+    away = func.coalesce(sides.c.away, -1)
+
+    def count(cond):
+        return func.count(case((cond, 1)))
+
+    def total(score):
+        return func.coalesce(func.sum(case((played, func.coalesce(score, 0)), else_=0)), 0)
+
+    query = (
+        db
+        .select(
+            Team.id.label('id'),
+            Team.name.label('name'),
+            Team.year.label('year'),
+            count(played).label('played'),
+            count(home > away).label('wins'),
+            count(and_(played, home == away)).label('draws'),
+            count(home < away).label('losses'),
+            total(sides.c.home).label('scored'),
+            total(sides.c.away).label('conceded'),
+        )
+        .outerjoin(sides, sides.c.team_id == Team.id)
+        .group_by(Team.id)
+        .order_by(Team.id)
+    )
+    if year is not None:
+        query = query.where(Team.year == year)
+    return query
+
+
+def compute_standings(year: Optional[int] = None) -> list[Standing]:
+    """
+    As `standings()`, but computed from the matches themselves
+    rather than read from the `standings` table
+    """
+    return [Standing(*row) for row in db.session.execute(_aggregate(year))]
+
+
+def rebuild(connection: Connection) -> None:
+    """Replace the contents of the `standings` table with freshly computed values"""
+    agg = _aggregate().subquery()
+    connection.execute(db.delete(TeamStanding))
+    connection.execute(
+        db.insert(TeamStanding).from_select(
+            ['team_id', 'year', *STAT_COLUMNS],
+            db.select(
+                agg.c.id, agg.c.year,
+                agg.c.played, agg.c.wins, agg.c.draws, agg.c.losses,
+                2 * agg.c.wins + agg.c.draws,
+                agg.c.scored, agg.c.conceded,
+            ),
+        )
+    )
+    bump(connection)
+
+
+@app.cli.command('rebuild-standings')
+@click.option('--numpy', 'use_numpy', is_flag=True, help='Check against the vectorised computation instead')
+def rebuild_standings_command(use_numpy: bool):
+    """Recompute the standings table, reporting any differences"""
+    if use_numpy:
+        from . import columnar
+        expected = {s.id: s for s in columnar.compute_standings()}
+    else:
+        expected = {s.id: s for s in compute_standings()}
+    actual = {s.id: s for s in standings()}
+
+    mismatched = [i for i in expected if expected[i] != actual.get(i)]
+    for i in mismatched:
+        click.echo(f'Team {i}: expected {expected[i]}, found {actual.get(i)}')
+
+    rebuild(db.session.connection())
+    db.session.commit()
+    click.echo(f'Rebuilt standings for {len(expected)} teams, {len(mismatched)} were incorrect')
+
+
+# --------------------------------------------
+# Maintaining the standings as matches change
+
+def _contribution(home: Optional[float], away: Optional[float]) -> dict[str, float]:
+    """
+    What a single match adds to the standing of a team, given the
+    scores from its point of view. Mirrors `Match.played` and `Match.winner`.
+    """
+    played = home is not None or away is not None
+    h = -1 if home is None else home
+    a = -1 if away is None else away
+    wins, draws, losses = int(h > a), int(played and h == a), int(h < a)
+    return dict(
+        played   = int(played),
+        wins     = wins,
+        draws    = draws,
+        losses   = losses,
+        points   = 2 * wins + draws,
+        scored   = (home or 0) if played else 0,
+        conceded = (away or 0) if played else 0,
+    )
+
+
+def _committed(match: Match, key: str):
+    """Value of an attribute as it was before this flush"""
+    hist = inspect(match).attrs[key].history
+    return (hist.deleted or hist.unchanged or (None,))[0]
+
+
+@event.listens_for(db.session, "after_flush")
+def _update_standings(session: Session, _):
+    """Apply the change in standings caused by every match in this flush"""
+
+    deltas: defaultdict[int, dict[str, float]] = defaultdict(lambda: dict.fromkeys(STAT_COLUMNS, 0))
+
+    def apply(team_id, home, away, sign):
+        for k, v in _contribution(home, away).items():
+            deltas[team_id][k] += sign * v
+
+    def add(team1_id, team2_id, score1, score2, sign):
+        apply(team1_id, score1, score2, sign)
+        apply(team2_id, score2, score1, sign)
+
+    for m in session.new:
+        if isinstance(m, Match):
+            add(m.team1_id, m.team2_id, m.score1, m.score2, +1)
+
+    for m in session.deleted:
+        if isinstance(m, Match):
+            add(*(_committed(m, k) for k in ('team1_id', 'team2_id', 'score1', 'score2')), -1)
+
+    for m in session.dirty:
+        if isinstance(m, Match) and session.is_modified(m):
+            add(*(_committed(m, k) for k in ('team1_id', 'team2_id', 'score1', 'score2')), -1)
+            add(m.team1_id, m.team2_id, m.score1, m.score2, +1)
+
+    # The standings of removed teams are dropped with them
+    removed = {t.id for t in session.deleted if isinstance(t, Team)}
+
+    for team_id, delta in deltas.items():
+        if team_id in removed or not any(delta.values()):
+            continue
+        stmt = insert(TeamStanding).values(
+            team_id=team_id,
+            year=db.select(Team.year).where(Team.id == team_id).scalar_subquery(),
+            **delta,
+        )
+        session.connection().execute(stmt.on_conflict_do_update(
+            index_elements=[TeamStanding.team_id],
+            set_={c: getattr(TeamStanding, c) + stmt.excluded[c] for c in STAT_COLUMNS},
+        ))
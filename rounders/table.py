@@ -0,0 +1,107 @@
+"""
+A small table of rows, for passing data from the routes to the templates.
+
+The pages only show tables of a few dozen to a few thousand rows,
+for which pandas costs far more than the data it holds.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable, Iterator, Mapping, Sequence
+
+
+class Row:
+    """A row of a `Table`, with its values looked up by column name as `row['id']`"""
+
+    __slots__ = ('_columns', '_values')
+
+    def __init__(self, columns: Mapping[str, int], values: Sequence[Any]) -> None:
+        self._columns = columns
+        self._values = values
+
+    def __getitem__(self, column: str) -> Any:
+        return self._values[self._columns[column]]
+
+    def __contains__(self, column: str) -> bool:
+        return column in self._columns
+
+    def __repr__(self) -> str:
+        return f'Row({ {c: self._values[i] for c, i in self._columns.items()} })'
+
+
+class Table:
+    """
+    Rows of values in named columns, which can be sorted, filtered and grouped.
+    Every operation returns a new table, sharing the rows of this one.
+    """
+
+    __slots__ = ('_columns', '_rows')
+
+    def __init__(self, columns: Mapping[str, Iterable[Any]]) -> None:
+        """Create a table from a dict of columns, each a list of values, as a pandas `DataFrame`"""
+        self._columns = {c: i for i, c in enumerate(columns)}
+        values = [list(v) for v in columns.values()]
+        if any(len(v) != len(values[0]) for v in values):
+            raise ValueError('All columns must be the same length')
+        self._rows = [Row(self._columns, r) for r in zip(*values)]
+
+    def _with_rows(self, rows: list[Row]) -> Table:
+        table = Table.__new__(Table)
+        table._columns = self._columns
+        table._rows = rows
+        return table
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._columns)
+
+    @property
+    def size(self) -> int:
+        """Number of values in the table, as `DataFrame.size`"""
+        return len(self._rows) * len(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Row]:
+        return iter(self._rows)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self._columns
+
+    def __getitem__(self, column: str) -> list[Any]:
+        """The values of a column"""
+        i = self._columns[column]
+        return [r._values[i] for r in self._rows]
+
+    def __repr__(self) -> str:
+        return f'<Table of {len(self)} rows: {", ".join(self._columns)}>'
+
+    def sort_values(self, by: str | Sequence[str], ascending: bool | Sequence[bool] = True) -> Table:
+        """
+        Sort by one or more columns, as `DataFrame.sort_values`.
+        The sort is stable, so rows with equal values keep their order.
+        """
+        keys = [by] if isinstance(by, str) else list(by)
+        orders = [ascending] * len(keys) if isinstance(ascending, bool) else list(ascending)
+        rows = list(self._rows)
+        # Sort by the least significant column first, relying on stability
+        for key, asc in reversed(list(zip(keys, orders))):
+            i = self._columns[key]
+            rows.sort(key=lambda r: r._values[i], reverse=not asc)
+        return self._with_rows(rows)
+
+    def where(self, predicate: Callable[[Row], bool]) -> Table:
+        """The rows for which `predicate` is true"""
+        return self._with_rows([r for r in self._rows if predicate(r)])
+
+    def groupby(self, by: str) -> list[tuple[Any, Table]]:
+        """
+        Split into tables of rows with the same value of `by`, keeping their order.
+        The groups are in order of their first row.
+        """
+        i = self._columns[by]
+        groups: dict[Any, list[Row]] = {}
+        for r in self._rows:
+            groups.setdefault(r._values[i], []).append(r)
+        return [(key, self._with_rows(rows)) for key, rows in groups.items()]
@@ -0,0 +1,159 @@
+"""
+Thumbnails and other variants of attachments, generated in the background
+by a pool of processes when photos are uploaded, so that pages never wait
+for Pillow.
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+import multiprocessing as mp
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import click
+from sqlalchemy.exc import OperationalError
+
+import config
+
+from . import app, db, filestore
+from .blogs import THUMB_FAILED, THUMB_PENDING, THUMB_READY, Attachment
+
+
+EXIF_ORIENTATION = 0x0112
+"""EXIF tag of the orientation of a photo, of which 5-8 turn it on its side"""
+
+
+def make_variants(src: str, variants: list[tuple[int, str]]) -> tuple[int, int]:
+    """
+    Save copies of the image at `src` shrunk to fit within each size,
+    to the paths given, the right way up. Runs in the pool.
+    Returns the width and height of the image the right way up.
+    """
+    # Imported here as Pillow is slow to import, and only needed in the pool
+    from PIL import Image, ImageOps
+    with Image.open(src) as im:
+        width, height = im.size
+        if im.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+
+        # Decode JPEGs at the smallest scale larger than every variant,
+        # which is much faster than decoding the whole photo. The largest
+        # fits its long side to the size, so only needs its short side in
+        # proportion; as stored, since this is before turning it round.
+        largest = max(size for size, _ in variants)
+        long, short = max(im.size), min(im.size)
+        box = (largest, math.ceil(largest * short / long))
+        im.draft(None, box if im.width >= im.height else (box[1], box[0]))
+        im = ImageOps.exif_transpose(im)
+
+        # Shrink each variant from the one before, largest first
+        for size, dst in sorted(variants, reverse=True):
+            im.thumbnail((size, size))
+            im.save(dst, quality=95)
+    return width, height
+
+
+@functools.cache
+def _pool() -> ProcessPoolExecutor:
+    # Spawned rather than forked, as this process has threads and open database connections
+    return ProcessPoolExecutor(max_workers=config.THUMB_WORKERS, mp_context=mp.get_context('spawn'))
+
+
+def _submit(attachment: Attachment) -> Future:
+    variants = [(size, str(path)) for size, path in attachment._variantpaths]
+    return _pool().submit(make_variants, str(attachment._filepath), variants)
+
+
+def _record(attachment: Attachment, future: Future) -> None:
+    """Record the result of generating the variants of `attachment`"""
+    if future.exception() is None:
+        attachment.thumb_state = THUMB_READY
+        attachment.width, attachment.height = future.result()
+    else:
+        attachment.thumb_state = THUMB_FAILED
+
+
+def reuse(attachment: Attachment) -> bool:
+    """
+    Share the variants of another attachment of the same photo, if they are
+    ready, rather than generating them again. Returns whether there were any.
+    """
+    other = db.session.scalars(
+        db.select(Attachment)
+        .where(Attachment.name == attachment.name, Attachment.thumb_state == THUMB_READY)
+        .limit(1)
+    ).first()
+    if other is None:
+        return False
+    attachment.thumb_state = THUMB_READY
+    attachment.width, attachment.height = other.width, other.height
+    return True
+
+
+def queue(attachment: Attachment) -> None:
+    """Generate the variants of `attachment` in the background, recording when they are ready"""
+    if attachment._filepath is None:
+        return
+    future = _submit(attachment)
+    future.add_done_callback(functools.partial(_finished, attachment.id, attachment.name, attachment._variantpaths))
+
+
+def _finished(attachment_id: int, name: str, variants: list[tuple[int, Path]], future: Future) -> None:
+    """Record the state of the variants once the pool is done with them"""
+    if future.exception() is not None:
+        app.logger.warning(f'Thumbnail of attachment {attachment_id} failed: {future.exception()}')
+
+    with app.app_context():
+        # With any other attachments of the same photo, which share its variants
+        waiting = db.session.scalars(
+            db.select(Attachment).where(Attachment.name == name, Attachment.thumb_state == THUMB_PENDING)
+        ).all()
+        if not waiting:
+            with filestore.lock(app.config['ATTACHMENTS_FOLDER']):
+                if not Attachment.references(name):
+                    # Deleted while the variants were being generated
+                    for _, path in variants:
+                        path.unlink(missing_ok=True)
+            return
+        for a in waiting:
+            _record(a, future)
+        try:
+            db.session.commit()
+        except OperationalError as e:
+            # Left pending, for `flask backfill-thumbs`
+            app.logger.warning(f'Could not record thumbnail of attachment {attachment_id}: {e}')
+
+
+@app.cli.command('backfill-thumbs')
+@click.option('--all', 'regenerate', is_flag=True, help='Regenerate every thumbnail, not only those not yet ready')
+def backfill_thumbs_command(regenerate: bool):
+    """Generate the thumbnails and other variants of attachments which don't have them yet"""
+    query = db.select(Attachment)
+    if not regenerate:
+        query = query.where(Attachment.thumb_state != THUMB_READY)
+
+    # Attachments of the same photo share its file, and its variants
+    shared: dict[str, list[Attachment]] = {}
+    for a in db.session.scalars(query):
+        if a._filepath is None:
+            a.thumb_state = THUMB_FAILED
+        else:
+            shared.setdefault(a.name, []).append(a)
+    futures = {_submit(attachments[0]): attachments for attachments in shared.values()}
+
+    generated = 0
+    for future in as_completed(futures):
+        attachments = futures[future]
+        for a in attachments:
+            _record(a, future)
+        a = attachments[0]
+        if a.thumb_state == THUMB_READY:
+            generated += 1
+            # From before variants of several sizes were generated
+            Path(a._filepath.parent, 'thumb_' + a.name).unlink(missing_ok=True) # type: ignore
+        else:
+            click.echo(f'Failed to generate thumbnail for {a.name}: {future.exception()}')
+    db.session.commit()
+    click.echo(f'Generated {generated} thumbnails')
@@ -0,0 +1,70 @@
+"""
+ZIP archives written straight to a response as they are built.
+
+The archive is never held in memory or on disk: each file is copied into
+it a chunk at a time, and the bytes written so far are handed on after
+every chunk. Entries are stored without compression, as photos are
+already compressed.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator
+
+CHUNK_SIZE = 64 * 1024
+"""Bytes read from each file at a time"""
+
+
+class _Pipe:
+    """
+    Unseekable file which keeps what is written to it until it is taken,
+    so that `zipfile` writes local headers and data descriptors as it goes
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(files: Iterable[tuple[str, Path]], date: int | None = None) -> Iterator[bytes]:
+    """
+    Yield the bytes of a ZIP archive of `files`, each the name
+    of an entry in the archive and the path to its contents.
+    Files which cannot be read are left out. Entries are dated
+    `date` (Unix epoch), or the time the file was modified.
+    """
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_STORED) as zf:  # type: ignore
+        for name, path in files:
+            try:
+                src = open(path, 'rb')
+            except OSError:
+                continue
+            with src:
+                stat = os.fstat(src.fileno())
+                info = zipfile.ZipInfo(name, time.localtime(date or stat.st_mtime)[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                # Known up front, so that zipfile knows whether it needs ZIP64
+                info.file_size = stat.st_size
+                with zf.open(info, 'w') as dst:
+                    while chunk := src.read(CHUNK_SIZE):
+                        dst.write(chunk)
+                        yield pipe.take()
+            yield pipe.take()
+    # The central directory, written when the archive is closed
+    yield pipe.take()